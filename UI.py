@@ -4,6 +4,7 @@ from PIL import ImageTk, Image
 from tkcalendar import Calendar
 import settings
 import image_interface
+import catalog
 import os
 
 
@@ -188,6 +189,8 @@ class App:
 
     def process(self):
         self.compose_filename()
+        if settings.use_catalog:
+            self.select_from_catalog()
         self.azimuth, self.altitude, self.cover_total_fixed, self.cover_total_hybrid, self.cover_total_tsi = \
             image_interface.single(self.filename)
         self.update_image()
@@ -197,9 +200,6 @@ class App:
         os.remove(settings.tmp + self.filename + '_fixed_old.png')
         os.remove(settings.tmp + self.filename + '_fixed.png')
         os.remove(settings.tmp + self.filename + '_hybrid.png')
-        os.remove(settings.tmp + self.filename + '.png')
-        os.remove(settings.tmp + self.filename + '.jpg')
-        os.remove(settings.tmp + self.filename + '.properties.gz')
 
     def update_image(self):
         filename1 = self.filename + '_original.png'
@@ -223,6 +223,20 @@ class App:
         self.date = settings.year + '-' + settings.month + '-' + settings.day
         self.time = settings.hour + ':' + settings.minute
 
+    def select_from_catalog(self):
+        # pick the frame closest to the requested date and time
+        connection = catalog.connect()
+        row = catalog.nearest(connection, self.filename)
+        connection.close()
+
+        if row is None:
+            print('Error: no frames found in the catalog')
+            return
+
+        self.filename = row['filename']
+        self.date = row['timestamp'][0:10]
+        self.time = row['timestamp'][11:16]
+
     def compose_filename(self):
         self.filename = self.date + self.time + '00'
         self.filename = self.filename.replace(':', '')
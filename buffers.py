@@ -0,0 +1,72 @@
+"""Pool of preallocated frame-sized arrays, keyed by shape and dtype.
+
+Every processed frame needs the same set of full-size arrays (pixels, ratios, class maps, labels, ...). Inside
+:meth:`buffers.frame` the hot functions get these arrays from the pool through their optional out= parameters, so after
+the first frames (warm-up) no new arrays are allocated. The buffers are handed out again in the next frame, so no array
+of the pool may be kept after its frame has finished.
+
+The pool is a module global, every worker process of the processing loop has its own pool. Outside
+:meth:`buffers.frame` the pool is not used and :meth:`buffers.get` returns a new array.
+"""
+from contextlib import contextmanager
+import numpy as np
+
+# buffers per (shape, dtype) and the amount of them which are in use by the current frame
+_pool = {}
+_used = {}
+_active = False
+
+# amount of buffers allocated by the current (or last) frame
+allocations = 0
+
+
+def get(shape, dtype):
+    """Get an array from the pool
+
+    The buffers are keyed by the shape without its first axis and the dtype. The amount of rows may vary per frame
+    (e.g. the amount of sky pixels, see :meth:`sky_pixels.colors`): the array is a view of the first rows of a buffer,
+    which is only reallocated if more rows are needed than ever before.
+
+    Args:
+        shape (tuple): shape of the array
+        dtype: data type of the array
+
+    Returns:
+        uninitialized array
+    """
+    global allocations
+
+    if not _active:
+        return np.empty(shape, dtype)
+
+    shape = tuple(shape)
+    key = (shape[1:], np.dtype(dtype))
+    buffers = _pool.setdefault(key, [])
+    n_used = _used.get(key, 0)
+
+    if n_used == len(buffers):
+        buffers.append(np.empty(shape, dtype))
+        allocations += 1
+    elif len(buffers[n_used]) < shape[0]:
+        buffers[n_used] = np.empty(shape, dtype)
+        allocations += 1
+
+    _used[key] = n_used + 1
+
+    return buffers[n_used][:shape[0]]
+
+
+@contextmanager
+def frame():
+    """Use the pool for the arrays of a single frame, all buffers are available again afterwards"""
+    global _active, allocations
+
+    _used.clear()
+    allocations = 0
+    _active = True
+
+    try:
+        yield
+    finally:
+        _active = False
+        _used.clear()
@@ -0,0 +1,313 @@
+"""Persistent catalog (SQLite) of all frames in the TSI archive.
+
+The catalog is built by scanning the daily tar archives under settings.tsi_database once. For every frame it stores the
+timestamp, solar position, the fractional sky cover of the old TSI software and the location (offset and size) of the
+three members inside the tar archive. Frames can then be selected with an (indexed) query and read directly from the
+archive, without walking the file system or decompressing the properties files again.
+
+The catalog is updated incrementally: only archives that are new or changed since the last scan are indexed.
+"""
+import settings
+import read_properties_file
+import sqlite3
+import tarfile
+import os
+from datetime import datetime
+
+schema = '''
+CREATE TABLE IF NOT EXISTS archives (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS frames (
+    filename TEXT PRIMARY KEY,
+    timestamp TEXT,
+    altitude REAL,
+    azimuth REAL,
+    thin_tsi REAL,
+    opaque_tsi REAL,
+    archive TEXT,
+    properties_offset INTEGER,
+    properties_size INTEGER,
+    jpg_offset INTEGER,
+    jpg_size INTEGER,
+    png_offset INTEGER,
+    png_size INTEGER
+);
+CREATE INDEX IF NOT EXISTS frames_timestamp ON frames (timestamp);
+CREATE INDEX IF NOT EXISTS frames_altitude ON frames (altitude);
+CREATE INDEX IF NOT EXISTS frames_archive ON frames (archive);
+'''
+
+# the extensions of the tar members (without the TSI filename filter)
+properties_member = '.properties.gz'
+jpg_member = '.jpg'
+png_member = '.png'
+
+
+def connect(database=None):
+    """Open the catalog and create the tables if they do not exist yet
+
+    Args:
+        database (str): location of the SQLite file, settings.catalog_database by default
+
+    Returns:
+        sqlite3 connection
+    """
+    connection = sqlite3.connect(database or settings.catalog_database)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(schema)
+
+    return connection
+
+
+def timestamp(filename):
+    """Convert a TSI filename (e.g. 20160601044900) to a sortable timestamp string (2016-06-01 04:49:00)
+
+    Args:
+        filename (str): TSI filename without extension
+
+    Returns:
+        str: timestamp
+    """
+    return filename[0:4] + '-' + filename[4:6] + '-' + filename[6:8] + ' ' + \
+        filename[8:10] + ':' + filename[10:12] + ':' + filename[12:14]
+
+
+def index_archive(connection, path):
+    """Read a daily tar archive sequentially and store all of its frames in the catalog
+
+    Args:
+        connection: sqlite3 connection
+        path (str): location of the tar archive
+    """
+    frames = {}
+
+    with tarfile.open(path) as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+
+            name = os.path.basename(member.name)
+
+            # use the same filter as the processing loop (e.g. '0.properties.gz')
+            if name.endswith(settings.properties_extension):
+                filename = name[:-len(properties_member)]
+                properties = read_properties_file.parse(tar.extractfile(member).read(), name)
+                frames.setdefault(filename, {}).update(altitude=properties.altitude,
+                                                       azimuth=properties.azimuth,
+                                                       thin_tsi=properties.thin_sky_cover_tsi,
+                                                       opaque_tsi=properties.opaque_sky_cover_tsi,
+                                                       properties_offset=member.offset_data,
+                                                       properties_size=member.size)
+            elif name.endswith(settings.jpg_extension):
+                frames.setdefault(name[:-len(jpg_member)], {}).update(jpg_offset=member.offset_data,
+                                                                      jpg_size=member.size)
+            elif name.endswith(settings.png_extension):
+                frames.setdefault(name[:-len(png_member)], {}).update(png_offset=member.offset_data,
+                                                                      png_size=member.size)
+
+    rows = []
+    for filename, frame in frames.items():
+        # frames without properties file or jpg can not be processed
+        if 'properties_offset' not in frame or 'jpg_offset' not in frame:
+            continue
+
+        rows.append((filename, timestamp(filename), frame['altitude'], frame['azimuth'], frame['thin_tsi'],
+                     frame['opaque_tsi'], path, frame['properties_offset'], frame['properties_size'],
+                     frame['jpg_offset'], frame['jpg_size'], frame.get('png_offset'), frame.get('png_size')))
+
+    connection.execute('DELETE FROM frames WHERE archive = ?', (path,))
+    connection.executemany('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+
+def update(connection, tsi_database=None):
+    """Index all daily tar archives which are new or have changed since the previous update
+
+    Args:
+        connection: sqlite3 connection
+        tsi_database (str): root of the TSI archive, settings.tsi_database by default
+
+    Returns:
+        int: amount of archives indexed
+    """
+    indexed = {row['path']: (row['size'], row['mtime']) for row in connection.execute('SELECT * FROM archives')}
+
+    n_archives = 0
+
+    for subdir, dirs, files in os.walk(tsi_database or settings.tsi_database):
+        dirs.sort()
+        files.sort()
+        for filename in files:
+            if filename.endswith(settings.tar_extension):
+                path = os.path.join(subdir, filename)
+                stat = os.stat(path)
+
+                if indexed.get(path) == (stat.st_size, stat.st_mtime):
+                    continue
+
+                print('Indexing', path, end='\r')
+
+                # store the frames and the archive in one transaction, so an interrupted update is simply redone
+                with connection:
+                    index_archive(connection, path)
+                    connection.execute('INSERT OR REPLACE INTO archives VALUES (?, ?, ?)',
+                                       (path, stat.st_size, stat.st_mtime))
+                n_archives += 1
+
+    return n_archives
+
+
+def select(connection, start=None, end=None, minimum_altitude=None):
+    """Select frames from the catalog, e.g. all frames with altitude >= 10 degrees in June 2016::
+
+        select(connection, '2016-06-01', '2016-07-01', 10)
+
+    Args:
+        connection: sqlite3 connection
+        start (str): first timestamp (inclusive)
+        end (str): last timestamp (exclusive)
+        minimum_altitude (float): minimum solar altitude in degrees
+
+    Returns:
+        list: catalog rows in filename order
+    """
+    query = 'SELECT * FROM frames WHERE 1'
+    parameters = []
+
+    if start is not None:
+        query += ' AND timestamp >= ?'
+        parameters.append(start)
+    if end is not None:
+        query += ' AND timestamp < ?'
+        parameters.append(end)
+    if minimum_altitude is not None:
+        query += ' AND altitude >= ?'
+        parameters.append(minimum_altitude)
+
+    return connection.execute(query + ' ORDER BY filename', parameters).fetchall()
+
+
+def find(connection, filename):
+    """Find a frame in the catalog
+
+    Args:
+        connection: sqlite3 connection
+        filename (str): TSI filename without extension, e.g. 20160601044900
+
+    Returns:
+        catalog row, None if the frame is not in the catalog
+    """
+    return connection.execute('SELECT * FROM frames WHERE filename = ?', (filename,)).fetchone()
+
+
+def nearest(connection, filename):
+    """Find the frame closest in time to the requested filename
+
+    Args:
+        connection: sqlite3 connection
+        filename (str): TSI filename without extension, e.g. 20160601044900
+
+    Returns:
+        catalog row, None if the catalog is empty
+    """
+    requested = timestamp(filename)
+
+    candidates = connection.execute('SELECT * FROM frames WHERE timestamp <= ? ORDER BY timestamp DESC LIMIT 1',
+                                    (requested,)).fetchall()
+    candidates += connection.execute('SELECT * FROM frames WHERE timestamp >= ? ORDER BY timestamp LIMIT 1',
+                                     (requested,)).fetchall()
+
+    if not candidates:
+        return None
+
+    # difference in time, not in the digits of the filenames (which jump at every minute, hour and day)
+    requested_time = datetime.strptime(requested, '%Y-%m-%d %H:%M:%S')
+
+    return min(candidates,
+               key=lambda row: abs(datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S') - requested_time))
+
+
+def read_member(f, offset, size):
+    """Read a member from an opened tar archive using its offset and size
+
+    Args:
+        f: tar archive opened in binary mode
+        offset (int): offset of the member data in the archive
+        size (int): size of the member data
+
+    Returns:
+        bytes: member data, None if the member is not in the archive
+    """
+    if offset is None:
+        return None
+
+    f.seek(offset)
+
+    return f.read(size)
+
+
+def frame_name(row):
+    """Get the filename without extension as used by the processing loop (e.g. without the trailing '0')
+
+    Args:
+        row: catalog row
+
+    Returns:
+        str: filename without extension
+    """
+    return (row['filename'] + properties_member).replace(settings.properties_extension, '')
+
+
+def read_frame(f, row):
+    """Read a frame from an opened tar archive using its catalog row
+
+    Only the properties file is read, the images are read when they are needed, see :meth:`frame_source.read`.
+
+    Args:
+        f: tar archive opened in binary mode
+        row: catalog row
+
+    Returns:
+        tuple: filename without extension, parsed properties file, jpg and png location (archive, offset and size, see
+        :class:`frame_source.Member`), the png location is None if there is no png
+    """
+    filename_no_ext = frame_name(row)
+    properties = read_properties_file.parse(read_member(f, row['properties_offset'], row['properties_size']),
+                                            row['filename'])
+    jpg = (row['archive'], row['jpg_offset'], row['jpg_size'])
+    png = (row['archive'], row['png_offset'], row['png_size']) if row['png_offset'] is not None else None
+
+    return filename_no_ext, properties, jpg, png
+
+
+def frames(rows, skip=()):
+    """Read the frames of the selected catalog rows from the archive
+
+    Args:
+        rows: catalog rows, see :meth:`catalog.select`
+        skip: filenames (without extension) of frames that are not read
+
+    Yields:
+        tuple: filename without extension, parsed properties file, jpg and png location, see :meth:`catalog.read_frame`
+    """
+    f = None
+    archive = None
+
+    try:
+        for row in rows:
+            if frame_name(row) in skip:
+                continue
+
+            # keep the archive open as long as the frames are in the same archive
+            if row['archive'] != archive:
+                if f is not None:
+                    f.close()
+                archive = row['archive']
+                f = open(archive, 'rb')
+
+            yield read_frame(f, row)
+    finally:
+        if f is not None:
+            f.close()
@@ -0,0 +1,58 @@
+"""Classify every pixel of a frame into a compact uint8 class map.
+
+The class maps are computed once per frame and shared by the sky cover, the pixel counts of the postprocessing, the
+overlays and the plots. The classes are settings.class_mask (0), class_clear (1), class_thin (2) and class_opaque (3).
+The hybrid class map has no thin class: every cloudy pixel is opaque.
+"""
+import numpy as np
+import settings
+import buffers
+
+
+def fixed(red_blue_ratio, fixed_sunny_threshold, fixed_thin_threshold, out=None):
+    """Classify every pixel (mask, clear, thin or opaque) by fixed thresholding of the red/blue ratio
+
+    A ratio of at most 0.01 is mask, at most the sunny threshold is clear sky, at most the thin threshold is thin and
+    above the thin threshold is opaque. The class of a pixel is the number of these limits its ratio exceeds, which
+    assumes 0.01 <= fixed_sunny_threshold <= fixed_thin_threshold.
+
+    Args:
+        red_blue_ratio: red/blue ratio per pixel, see :meth:`ratio.compute`
+        fixed_sunny_threshold (float): clear sky/cloudy fixed threshold
+        fixed_thin_threshold (float): thin/opaque fixed threshold
+        out: preallocated uint8 array for the classes, see :meth:`buffers.get`
+
+    Returns:
+        uint8 class per pixel
+    """
+    if out is None:
+        out = np.empty(red_blue_ratio.shape, dtype=np.uint8)
+    limit = buffers.get(red_blue_ratio.shape, np.bool_)
+
+    np.greater(red_blue_ratio, 0.01, out=out.view(np.bool_))
+    out += np.greater(red_blue_ratio, fixed_sunny_threshold, out=limit)
+    out += np.greater(red_blue_ratio, fixed_thin_threshold, out=limit)
+
+    return out
+
+
+def hybrid(blue_red_ratio_norm, threshold, out=None):
+    """Classify every pixel (mask, clear or opaque) by the hybrid threshold of the normalized blue/red ratio
+
+    Args:
+        blue_red_ratio_norm: normalized blue/red ratio per pixel, see :meth:`ratio.compute`
+        threshold (float): clear sky/cloud threshold determined by the hybrid algorithm
+        out: preallocated uint8 array for the classes, see :meth:`buffers.get`
+
+    Returns:
+        uint8 class per pixel
+    """
+    if out is None:
+        out = np.empty(blue_red_ratio_norm.shape, dtype=np.uint8)
+    condition = buffers.get(blue_red_ratio_norm.shape, np.bool_)
+
+    out.fill(settings.class_opaque)
+    np.copyto(out, settings.class_clear, where=np.greater_equal(blue_red_ratio_norm, threshold, out=condition))
+    np.copyto(out, settings.class_mask, where=np.equal(blue_red_ratio_norm, settings.mask_value, out=condition))
+
+    return out
@@ -0,0 +1,136 @@
+"""Columnar (Feather) output data with typed columns.
+
+With settings.output_format = 'feather' the processing loop writes the output data to a Feather (Arrow IPC) file in
+stead of a csv file. The types of the columns follow from :meth:`write_to_csv.schema`: float32 sky covers and features,
+int32 pixel counts and, for TSI data, a datetime64 timestamp derived from the filename. The rows are appended as record
+batches of settings.batch_size rows.
+
+The postprocessing, plotting and machine learning steps read the output data with :meth:`columnar.read`, which returns
+the columns by name for both formats. Feather files are memory-mapped, so only the columns that are used are read.
+pyarrow is only needed for the Feather format.
+"""
+import settings
+import write_to_csv
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+feather_extension = '.feather'
+
+
+def timestamp(filename):
+    """Get the time of a TSI frame from its filename, e.g. 2016-06-01T04:49:00 for 2016060104490
+
+    Args:
+        filename (str): filename without extension
+
+    Returns:
+        numpy.datetime64: time of the frame
+    """
+    return np.datetime64(filename[0:4] + '-' + filename[4:6] + '-' + filename[6:8] + 'T' +
+                         filename[8:10] + ':' + filename[10:12] + ':' + filename[12:13] + '0', 's')
+
+
+class ColumnarWriter:
+    """Writer of the output data to a Feather file, which can be used in stead of a csv writing object
+
+    The file can only be read once it is closed. When used as a context manager, the file is closed on exit, also
+    after an exception, so the rows written so far can be read.
+
+    Args:
+        path (str): location of the Feather file
+        data_type (str): type of data, settings.data_type by default
+    """
+    def __init__(self, path, data_type=None):
+        if pyarrow is None:
+            raise Exception('pyarrow is needed for settings.output_format = \'feather\'')
+
+        data_type = data_type or settings.data_type
+
+        self.columns = write_to_csv.schema(data_type)
+        self.derived_columns = write_to_csv.derived_columns.get(data_type, [])
+        self.schema = pyarrow.schema([(name, pyarrow.from_numpy_dtype(np.dtype(dtype)))
+                                      for name, dtype in self.columns + self.derived_columns])
+
+        self.sink = pyarrow.OSFile(path, 'wb')
+        self.writer = pyarrow.ipc.new_file(self.sink, self.schema)
+
+        # rows which are not written yet
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def writerow(self, data_row):
+        """Add a row, the rows are written per settings.batch_size rows
+
+        Args:
+            data_row: values in the order of :meth:`write_to_csv.schema`, None for missing values
+        """
+        self.rows.append(data_row)
+
+        if len(self.rows) >= settings.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the collected rows as one record batch"""
+        if not self.rows:
+            return
+
+        values = list(zip(*self.rows))
+
+        # derived columns
+        for name, dtype in self.derived_columns:
+            if name == 'timestamp':
+                values.append([timestamp(filename) for filename in values[0]])
+
+        arrays = [pyarrow.array(column, type=field.type) for column, field in zip(values, self.schema)]
+        self.writer.write_batch(pyarrow.record_batch(arrays, schema=self.schema))
+
+        self.rows = []
+
+    def close(self):
+        """Write the remaining rows and close the file"""
+        try:
+            self.flush()
+        finally:
+            self.writer.close()
+            self.sink.close()
+
+
+def read(path, columns=None, data_type=None):
+    """Read columns of the output data by name from a csv or Feather file
+
+    Args:
+        path (str): location of the output data
+        columns (list): names of the columns to read, all columns if None
+        data_type (str): type of data, settings.data_type by default
+
+    Returns:
+        dict: NumPy array per column name
+    """
+    if path.endswith(feather_extension):
+        if pyarrow is None:
+            raise Exception('pyarrow is needed to read ' + path)
+
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+
+        if columns is None:
+            columns = table.column_names
+
+        return {name: table.column(name).to_numpy() for name in columns}
+
+    data = np.atleast_1d(np.genfromtxt(path, skip_header=1, delimiter=settings.delimiter,
+                                       dtype=write_to_csv.schema(data_type)))
+
+    if columns is None:
+        columns = data.dtype.names
+
+    return {name: data[name] for name in columns}
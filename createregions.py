@@ -8,6 +8,14 @@ from math import cos, sin, sqrt, tan, pi
 import numpy as np
 import settings
 import mask
+import overlay
+import buffers
+
+# polar coordinates of every pixel per resolution, see :meth:`createregions.grid`
+_grids = {}
+
+# colors of the region labels (0: mask, 1: outside, 2: horizon area, 3: inner circle, 4: sun circle)
+palette = np.array([settings.black, settings.red, settings.cyan, settings.green, settings.yellow], dtype=np.uint8)
 
 
 def large_circle(regions, outlines):
@@ -82,6 +90,30 @@ def inner_circle(regions, outlines):
     return regions, outlines
 
 
+def sun_position(altitude, theta):
+    """Calculate the position of the sun in the image plane, see :meth:`createregions.sun_circle`
+
+    Args:
+        altitude (float): altitude of the sun, taken from the properties file
+        theta: azimuth measured from the East
+
+    Returns:
+        tuple: x and y position of the sun (pixels)
+    """
+    # altitude from degrees to radians
+    altitude_radians = altitude * pi / 180
+    a = -0.23
+    b = -tan(altitude_radians)
+    c = 1.25
+    d = b ** 2 - 4 * a * c
+    r = settings.radius_mirror * (-b - sqrt(d)) / (2 * a) / 2
+    # x and y position of the sun
+    x_sun = int(settings.x / 2 + r * cos(theta))
+    y_sun = int(settings.y / 2 + r * sin(theta))
+
+    return x_sun, y_sun
+
+
 def sun_circle(altitude, regions, outlines, theta):
     """Draw the sun circle segment
 
@@ -102,16 +134,7 @@ def sun_circle(altitude, regions, outlines, theta):
     Returns:
         tuple: regions, labels, outlines
     """
-    # altitude from degrees to radians
-    altitude_radians = altitude * pi / 180
-    a = -0.23
-    b = -tan(altitude_radians)
-    c = 1.25
-    d = b ** 2 - 4 * a * c
-    r = settings.radius_mirror * (-b - sqrt(d)) / (2 * a) / 2
-    # x and y position of the sun
-    x_sun = int(settings.x / 2 + r * cos(theta))
-    y_sun = int(settings.y / 2 + r * sin(theta))
+    x_sun, y_sun = sun_position(altitude, theta)
     # draw the circle
     cv2.circle(regions, (x_sun, y_sun), settings.radius_sun_circle, settings.yellow, -1)
     cv2.circle(outlines, (x_sun, y_sun), settings.radius_sun_circle, settings.black, -1)
@@ -156,35 +179,6 @@ def outer_circle(regions, labels, outlines, stencil, stencil_labels):
     return regions, labels, outlines
 
 
-def overlay_outlines_on_image(img, outlines, stencil):
-    """Overlay outlines on image by converting to BW and performing several other operations
-
-    Args:
-        img (int): image in NumPy format
-        outlines (int): RGB array of the segment outlines
-        stencil (int): stencil array in RGB format
-
-    Returns:
-        int: image with outlines as overlay
-    """
-    # create mask of outlines and create inverse mask
-    img2gray = cv2.cvtColor(outlines, cv2.COLOR_BGR2GRAY)
-    ret, mask_array = cv2.threshold(img2gray, 10, settings.max_color_value-1, cv2.THRESH_BINARY)
-    mask_inv = cv2.bitwise_not(mask_array)
-
-    # black out area of outlines
-    img_bg = cv2.bitwise_and(img[0:settings.y, 0:settings.x], img[0:settings.y, 0:settings.x], mask=mask_inv)
-
-    # take only region of outlines from outlines image
-    outlines_fg = cv2.bitwise_and(outlines, outlines, mask=mask_array)
-
-    dst = cv2.add(img_bg, outlines_fg)
-
-    image_with_outlines = cv2.bitwise_and(dst, stencil)
-
-    return image_with_outlines
-
-
 def draw_arm(regions, labels, image_with_outlines):
     """Draw the camera arm mask
 
@@ -232,6 +226,86 @@ def draw_band(regions, labels, image_with_outlines, theta):
     return regions, labels, image_with_outlines
 
 
+def grid(shape):
+    """Get the polar coordinates of every pixel with respect to the center of the image, cached per resolution
+
+    Args:
+        shape (tuple): resolution (rows, columns) of the image
+
+    Returns:
+        tuple: squared radius (integer), angle (radians, measured from the East in the image plane), row and column
+        index of every pixel
+    """
+    if shape not in _grids:
+        rows, columns = np.indices(shape)
+        dx = columns - int(settings.x / 2)
+        dy = rows - int(settings.y / 2)
+
+        _grids[shape] = dx ** 2 + dy ** 2, np.arctan2(dy, dx), rows, columns
+
+    return _grids[shape]
+
+
+def label_map(shape, azimuth, altitude, mask_array=None, out=None):
+    """Get the region labels directly from the polar coordinates of the pixels
+
+    The regions are the same as the ones drawn by :meth:`createregions.create`: the large circle (1), the horizon area
+    within the large circle (2), the inner circle (3) and the sun circle (4). A pixel belongs to a circle if its
+    squared distance to the center is at most the squared radius, which gives the same pixels as cv2.circle. A pixel
+    belongs to the horizon area if its angle differs at most settings.width_horizon_area_degrees from the direction
+    of the sun; only pixels on the edges of the drawn polygon can be labelled differently.
+
+    Args:
+        shape (tuple): resolution (rows, columns) of the image
+        azimuth (float): azimuth of the sun, taken from the properties file
+        altitude (float): altitude of the sun, taken from the properties file
+        mask_array: boolean mask, see :meth:`mask.create`, the masked pixels get label 0
+        out: preallocated uint8 array for the labels, see :meth:`buffers.get`
+
+    Returns:
+        label map (uint8)
+    """
+    radius_squared, angle, rows, columns = grid(shape)
+
+    # angle from the east in stead of north
+    theta = (azimuth - 90) * pi / 180
+    width = settings.width_horizon_area_degrees * pi / 180
+
+    x_sun, y_sun = sun_position(altitude, theta)
+
+    labels = np.empty(shape, dtype=np.uint8) if out is None else out
+    labels.fill(0)
+
+    large = np.less_equal(radius_squared, settings.radius_circle ** 2, out=buffers.get(shape, np.bool_))
+    np.copyto(labels, 1, where=large)
+
+    # angles within width of the direction of the sun, the angles of the grid are in the range [-pi, pi]
+    theta = (theta + pi) % (2 * pi) - pi
+    lower = theta - width
+    upper = theta + width
+    horizon = np.greater_equal(angle, lower, out=buffers.get(shape, np.bool_))
+    condition = buffers.get(shape, np.bool_)
+    horizon &= np.less_equal(angle, upper, out=condition)
+    if lower < -pi:
+        horizon |= np.greater_equal(angle, lower + 2 * pi, out=condition)
+    if upper > pi:
+        horizon |= np.less_equal(angle, upper - 2 * pi, out=condition)
+    np.copyto(labels, 2, where=np.logical_and(large, horizon, out=condition))
+
+    np.copyto(labels, 3, where=np.less_equal(radius_squared, settings.radius_inner_circle ** 2, out=condition))
+
+    # the sun circle is only evaluated in the box around the sun
+    r = settings.radius_sun_circle
+    box = (slice(max(y_sun - r, 0), max(y_sun + r + 1, 0)), slice(max(x_sun - r, 0), max(x_sun + r + 1, 0)))
+    sun = (columns[box] - x_sun) ** 2 + (rows[box] - y_sun) ** 2 <= r ** 2
+    labels[box][sun] = 4
+
+    if mask_array is not None:
+        np.copyto(labels, 0, where=np.logical_not(mask_array, out=condition))
+
+    return labels
+
+
 def labels_from_regions(labels, regions):
     """Get the 'labels' representation from the 'regions' representation.
 
@@ -268,11 +342,12 @@ def create(img, azimuth, altitude, mask_array):
         tuple: regions, outlines, labels, stencil, image_with_outlines
     """
     # variable assignment
-    labels = np.zeros((settings.y, settings.x))
-    regions = np.zeros((settings.y, settings.x, settings.n_colors), dtype="uint8")
-    outlines = np.zeros((settings.y, settings.x, settings.n_colors), dtype="uint8")
-    stencil = np.zeros(regions.shape, dtype="uint8")
-    stencil_labels = np.zeros(labels.shape, dtype="uint8")
+    regions = buffers.get((settings.y, settings.x, settings.n_colors), np.uint8)
+    outlines = buffers.get((settings.y, settings.x, settings.n_colors), np.uint8)
+    stencil = buffers.get(regions.shape, np.uint8)
+    stencil_labels = buffers.get((settings.y, settings.x), np.uint8)
+    for array in (regions, outlines, stencil, stencil_labels):
+        array.fill(0)
     # convert from BGR -> RGB
     # conversion needs to be centralized in one place.
     img = img[..., ::-1]
@@ -283,15 +358,21 @@ def create(img, azimuth, altitude, mask_array):
     regions, outlines = inner_circle(regions, outlines)
     regions, outlines = sun_circle(altitude, regions, outlines, theta)
     stencil, stencil_labels = create_stencil(stencil, stencil_labels)
-    image_with_outlines = overlay_outlines_on_image(img, outlines, stencil)
-
-    # apply mask to regions
-    masked_regions = mask.apply(regions, mask_array)
+    image_with_outlines = overlay.outlines_over_image(img, outlines, stencil, out=buffers.get(regions.shape, np.uint8))
 
     # apply mask to image with outlines
-    image_with_outlines = mask.apply(image_with_outlines, mask_array)
-
-    # convert regions to labels
-    labels = labels_from_regions(labels, masked_regions)
+    image_with_outlines = mask.apply(image_with_outlines, mask_array, out=buffers.get(regions.shape, np.uint8))
+
+    if settings.use_polar_regions:
+        # labels from the polar coordinates, the regions are colored using the labels
+        labels = label_map((settings.y, settings.x), azimuth, altitude, mask_array,
+                           out=buffers.get((settings.y, settings.x), np.uint8))
+        masked_regions = palette.take(labels, axis=0, out=buffers.get(regions.shape, np.uint8), mode='clip')
+    else:
+        # apply mask to regions
+        masked_regions = mask.apply(regions, mask_array)
+
+        # convert regions to labels
+        labels = labels_from_regions(np.zeros((settings.y, settings.x)), masked_regions)
 
     return masked_regions, outlines, labels, stencil, image_with_outlines
@@ -0,0 +1,186 @@
+"""Sources of TSI frames.
+
+A frame consists of three files which share the same timestamp in the filename: the properties file
+(*.properties.gz), the original image (*.jpg) and the image processed by the old TSI software (*.png). Every source
+yields the frames in filename order as tuples::
+
+    (filename_no_ext, properties, jpg, png)
+
+where properties is the parsed properties file (see :meth:`read_properties_file.parse`) and jpg/png are the locations
+of the encoded images (see :class:`frame_source.Member`), png is None if there is no png. Only the properties files are
+read by the sources: the images are read (:meth:`frame_source.read`) and decoded (:meth:`frame_source.decode_image`)
+by the worker process when they are needed, so frames which are skipped (e.g. at night) cost no image reads and only
+the small locations are sent to the worker processes. No temporary files are needed when the frames are read from the
+daily tar archives.
+"""
+import settings
+import catalog
+import read_properties_file
+from collections import namedtuple
+import numpy as np
+import cv2
+import os
+import tarfile
+
+
+# location of an encoded image: a file (offset None) or a member of an uncompressed tar archive (offset and size of
+# the member data)
+Member = namedtuple('Member', ['path', 'offset', 'size'])
+
+
+def read(member):
+    """Read an encoded image from its location
+
+    Args:
+        member: location of the image, see :class:`frame_source.Member`, None if there is no image
+
+    Returns:
+        bytes: encoded image, None if there is no image
+    """
+    if member is None:
+        return None
+
+    path, offset, size = member
+
+    with open(path, 'rb') as f:
+        if offset is None:
+            return f.read()
+
+        f.seek(offset)
+
+        return f.read(size)
+
+
+def decode_image(data):
+    """Decode an encoded (jpg/png) image in memory
+
+    Args:
+        data (bytes): encoded image
+
+    Returns:
+        image in NumPy format (BGR), None if there is no data
+    """
+    if data is None:
+        return None
+
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def directory(main_data, skip=()):
+    """Walk a directory with unpacked TSI files and yield the frames in filename order
+
+    Args:
+        main_data (str): directory containing the TSI files
+        skip: filenames (without extension) of frames that are not read
+
+    Yields:
+        tuple: filename without extension, parsed properties file, jpg and png location
+    """
+    for subdir, dirs, files in os.walk(main_data):
+        dirs.sort()
+        files.sort()
+        for filename in files:
+            if filename.endswith(settings.properties_extension):
+                filename_no_ext = filename.replace(settings.properties_extension, '')
+                if filename_no_ext in skip:
+                    continue
+
+                with open(os.path.join(subdir, filename), 'rb') as f:
+                    properties = read_properties_file.parse(f.read(), filename)
+
+                jpg = Member(os.path.join(subdir, filename_no_ext + settings.jpg_extension), None, None)
+                png = Member(os.path.join(subdir, filename_no_ext + settings.png_extension), None, None)
+                if not os.path.exists(png.path):
+                    png = None
+
+                yield filename_no_ext, properties, jpg, png
+
+
+def tar_archive(path, skip=()):
+    """Read the properties files of a daily TSI tar archive and yield the frames without extracting them to disk
+
+    The members of the frames are collected while reading the archive, the data of the images is not read. Afterwards
+    the frames are yielded in filename order, as the postprocessing windows and the online correction expect. Frames
+    without a png are yielded as well, frames without a jpg or properties file are skipped.
+
+    Args:
+        path (str): location of the tar archive
+        skip: filenames (without extension) of frames that are not read
+
+    Yields:
+        tuple: filename without extension, parsed properties file, jpg and png location
+    """
+    extensions = (settings.properties_extension, settings.jpg_extension, settings.png_extension)
+
+    # members (properties file data, jpg and png location) and name of the properties file per frame
+    members = {}
+    properties_names = {}
+
+    # random access, so the data of the images is skipped
+    with tarfile.open(path, 'r:') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+
+            name = os.path.basename(member.name)
+            for position, extension in enumerate(extensions):
+                if name.endswith(extension):
+                    break
+            else:
+                continue
+
+            filename_no_ext = name[:-len(extension)]
+            if filename_no_ext in skip:
+                continue
+
+            frame = members.setdefault(filename_no_ext, [None, None, None])
+            if position == 0:
+                frame[position] = tar.extractfile(member).read()
+                properties_names[filename_no_ext] = name
+            else:
+                frame[position] = Member(path, member.offset_data, member.size)
+
+    for filename_no_ext in sorted(members):
+        properties_data, jpg, png = members.pop(filename_no_ext)
+        if properties_data is not None and jpg is not None:
+            properties = read_properties_file.parse(properties_data, properties_names[filename_no_ext])
+            yield filename_no_ext, properties, jpg, png
+
+
+def tar_archives(main_data, skip=()):
+    """Yield the frames of all daily tar archives found (recursively) in a directory
+
+    Args:
+        main_data (str): directory containing the daily tar archives
+        skip: filenames (without extension) of frames that are not read
+
+    Yields:
+        tuple: filename without extension, parsed properties file, jpg and png location
+    """
+    for subdir, dirs, files in os.walk(main_data):
+        dirs.sort()
+        files.sort()
+        for filename in files:
+            if filename.endswith(settings.tar_extension):
+                yield from tar_archive(os.path.join(subdir, filename), skip)
+
+
+def frames(skip=()):
+    """Determine and call the frame source: the catalog, the daily tar archives or the directory settings.main_data
+
+    Args:
+        skip: filenames (without extension) of frames that are not read, e.g. a :class:`manifest.Manifest`
+
+    Returns:
+        generator of frames
+    """
+    if settings.use_catalog:
+        connection = catalog.connect()
+        catalog.update(connection)
+        rows = catalog.select(connection, settings.catalog_start, settings.catalog_end, settings.minimum_altitude)
+        connection.close()
+        return catalog.frames(rows, skip)
+    elif settings.use_tar_archive:
+        return tar_archives(settings.main_data, skip)
+    else:
+        return directory(settings.main_data, skip)
@@ -8,9 +8,11 @@ import skycover
 import createregions
 import numpy as np
 import ratio
+import classmap
 import labelled_image
 import overlay
-import gzip
+import frame_source
+import catalog
 import matplotlib.pyplot as plt
 import tarfile
 import os
@@ -60,44 +62,44 @@ def read_from_tar(filename_no_ext):
     settings.hour = filename_no_ext[8:10]
     settings.minute = filename_no_ext[10:12]
 
-    path = settings.tsi_database + settings.year + '/' + settings.month + '/DBASE/' + settings.year + settings.month + \
-           settings.day + '_tsi-cabauw_realtime.tar'
+    if settings.use_catalog:
+        # read the members directly from the archive using their location in the catalog
+        connection = catalog.connect()
+        row = catalog.find(connection, filename_no_ext)
+        connection.close()
 
-    tar = tarfile.open(path)
+        with open(row['archive'], 'rb') as f:
+            jpg_data = catalog.read_member(f, row['jpg_offset'], row['jpg_size'])
+            png_data = catalog.read_member(f, row['png_offset'], row['png_size'])
+            properties_data = catalog.read_member(f, row['properties_offset'], row['properties_size'])
+    else:
+        path = settings.tsi_database + settings.year + '/' + settings.month + '/DBASE/' + settings.year + \
+               settings.month + settings.day + settings.tar_extension
 
-    tar.extract(filename_jpg, 'tmp')
-    tar.extract(filename_png, 'tmp')
-    tar.extract(properties_file, 'tmp')
+        # read the members in memory in stead of extracting them to the tmp folder
+        with tarfile.open(path) as tar:
+            jpg_data = tar.extractfile(filename_jpg).read()
+            png_data = tar.extractfile(filename_png).read()
+            properties_data = tar.extractfile(properties_file).read()
 
-    tar.close()
+    properties = read_properties_file.parse(properties_data, properties_file)
 
-    jpg_loc = 'tmp/' + filename_jpg
-    png_loc = 'tmp/' + filename_png
-    properties_loc = 'tmp/' + properties_file
+    # get the altitude and azimuth from the properties file
+    altitude = properties.altitude
+    azimuth = properties.azimuth
 
-    # unzip the gzip file, open the file as rt=read text
-    with gzip.open(properties_loc, 'rt') as f:
-        lines = []
-        # read the file and store line per line
-        for line in f:
-            lines.append(line)
+    img = frame_source.decode_image(jpg_data)
+    img_tsi_processed = frame_source.decode_image(png_data)
 
-    # get the altitude and azimuth from the defs
-    altitude = read_properties_file.get_altitude(lines)
-    azimuth = read_properties_file.get_azimuth(lines)
-
-    img = cv2.imread(jpg_loc)
-    img_tsi_processed = cv2.imread(png_loc)
-
-    return img, img_tsi_processed, lines, filename_jpg, filename_png, azimuth, altitude
+    return img, img_tsi_processed, properties, filename_jpg, filename_png, azimuth, altitude
 
 
 def single(filename):
-    img, img_tsi_processed, properties_file, filename_jpg, filename_png, azimuth, altitude = read_from_tar(filename)
+    img, img_tsi_processed, properties, filename_jpg, filename_png, azimuth, altitude = read_from_tar(filename)
 
     if altitude >= settings.minimum_altitude:
         # get the fractional sky cover from 'old' TSI software
-        cover_thin_tsi, cover_opaque_tsi, cover_total_tsi = read_properties_file.get_fractional_sky_cover_tsi(properties_file)
+        cover_thin_tsi, cover_opaque_tsi, cover_total_tsi = properties.fractional_sky_cover_tsi()
 
         # get the resolution of the image
         resolution.get_resolution(img)
@@ -106,18 +108,18 @@ def single(filename):
         mask_array = mask.create(img, azimuth)
         masked_img = mask.apply(img, mask_array)
 
-        # calculate red/blue ratio per pixel
-        red_blue_ratio = ratio.red_blue_v2(masked_img)
+        # calculate red/blue, blue/red and normalized blue/red ratio per pixel
+        red_blue_ratio, blue_red_ratio, blue_red_ratio_norm = ratio.compute(masked_img)
 
         # calculate fixed fractional skycover
         fixed_sunny_threshold, fixed_thin_threshold = thresholds.fixed()
-        cover_thin_fixed, cover_opaque_fixed, cover_total_fixed = skycover.fixed(red_blue_ratio,
-                                                                                 fixed_sunny_threshold,
-                                                                                 fixed_thin_threshold)
+        classes = classmap.fixed(red_blue_ratio, fixed_sunny_threshold, fixed_thin_threshold)
+        cover_thin_fixed, cover_opaque_fixed, cover_total_fixed = skycover.fixed_table(
+            labelled_image.contingency_table(None, classes))
 
         # calculate hybrid sky cover
         ratio_br_norm_1d_nz, blue_red_ratio_norm, st_dev, hybrid_threshold = thresholds.hybrid(
-            masked_img)
+            blue_red_ratio_norm)
         cover_total_hybrid = skycover.hybrid(ratio_br_norm_1d_nz, hybrid_threshold)
 
         # create the segments for solar correction
@@ -126,10 +128,9 @@ def single(filename):
                                                                                            mask_array)
 
         # overlay outlines on image(s)
-        image_with_outlines_fixed = overlay.fixed(red_blue_ratio, outlines, stencil,
-                                                      fixed_sunny_threshold,
-                                                      fixed_thin_threshold)
-        image_with_outlines_hybrid = overlay.hybrid(masked_img, outlines, stencil, hybrid_threshold)
+        image_with_outlines_fixed = overlay.render(classes, outlines, stencil)
+        image_with_outlines_hybrid = overlay.render(classmap.hybrid(blue_red_ratio_norm, hybrid_threshold),
+                                                    outlines, stencil)
 
         save_processed_image(image_with_outlines_hybrid, settings.tmp + filename + '_hybrid.png')
         save_processed_image(image_with_outlines_fixed, settings.tmp + filename + '_fixed.png')
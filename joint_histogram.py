@@ -0,0 +1,133 @@
+"""Joint (B, R) histogram of an 8-bit image as the sufficient statistic of a frame.
+
+The fixed and hybrid sky covers, the thresholds and the pixel counts of the labelled image only depend on the (B, R)
+pair of every pixel. Counting the pairs with a single np.bincount reduces a frame to a 256x256 table, from which all of
+these quantities are derived using the lookup tables of :meth:`ratio.tables`.
+"""
+import settings
+import ratio
+import thresholds
+import skycover
+import numpy as np
+
+
+def compute(img, labels=None):
+    """Count the (B, R) pairs of an 8-bit image, optionally per region label
+
+    Args:
+        img: 8-bit masked image
+        labels: scalar representation (0, 1, 2, ...) of the segmented image, see :meth:`createregions.create`
+
+    Returns:
+        joint histogram of shape (256, 256), or (n_labels, 256, 256) if labels are given (at least settings.n_regions
+        labels)
+    """
+    index = ratio.table_index(img).ravel()
+    n_pairs = settings.max_color_value ** 2
+
+    if labels is None:
+        hist = np.bincount(index, minlength=n_pairs)
+        return hist.reshape(settings.max_color_value, settings.max_color_value)
+
+    labels = labels.astype(np.intp).ravel()
+    n_labels = max(int(labels.max()) + 1, settings.n_regions)
+    hist = np.bincount(labels * n_pairs + index, minlength=n_labels * n_pairs)
+
+    return hist.reshape(n_labels, settings.max_color_value, settings.max_color_value)
+
+
+def table(hist, fixed_sunny_threshold, fixed_thin_threshold):
+    """Get the amount of pixels per region label and fixed threshold class, see :meth:`labelled_image.contingency_table`
+
+    Args:
+        hist: joint (B, R) histogram, or joint (B, R) histogram per region label
+        fixed_sunny_threshold (float): clear sky/cloudy fixed threshold
+        fixed_thin_threshold (float): thin/opaque fixed threshold
+
+    Returns:
+        table of shape (n_labels, n_classes), a single row if hist is not given per region label
+    """
+    classes = ratio.fixed_classes_table(fixed_sunny_threshold, fixed_thin_threshold).ravel()
+    hist = hist.reshape(-1, settings.max_color_value ** 2)
+
+    counts = [np.bincount(classes, weights=hist_label, minlength=settings.n_classes) for hist_label in hist]
+
+    return np.array(counts).astype(np.int64)
+
+
+def fixed(hist, fixed_sunny_threshold, fixed_thin_threshold):
+    """Calculate the fractional sky cover based on fixed thresholding, see :meth:`skycover.fixed`
+
+    Args:
+        hist: joint (B, R) histogram
+        fixed_sunny_threshold (float): clear sky/cloudy fixed threshold
+        fixed_thin_threshold (float): thin/opaque fixed threshold
+
+    Returns:
+        tuple: thin sky cover, opaque sky cover and fractional sky cover
+    """
+    return skycover.fixed_table(table(hist, fixed_sunny_threshold, fixed_thin_threshold))
+
+
+def normalized_ratios(hist):
+    """Get the normalized blue/red ratios that occur in the frame and how often they occur
+
+    Args:
+        hist: joint (B, R) histogram
+
+    Returns:
+        tuple: normalized blue/red ratios (mask excluded) and their counts
+    """
+    blue_red_ratio_norm = ratio.tables()[2]
+
+    valid = np.logical_and(hist > 0, blue_red_ratio_norm != settings.mask_value)
+
+    return blue_red_ratio_norm[valid], hist[valid]
+
+
+def hybrid_threshold(hist):
+    """Decide between fixed or MCE thresholding as part of hybrid thresholding algorithm, see :meth:`thresholds.hybrid`
+
+    Args:
+        hist: joint (B, R) histogram
+
+    Returns:
+        tuple: standard deviation of the normalized blue/red ratio and hybrid threshold
+    """
+    values, counts = normalized_ratios(hist)
+
+    # calculate (weighted) standard deviation
+    mean = np.average(values, weights=counts)
+    st_dev = np.sqrt(np.average(np.square(values - mean, dtype=np.float64), weights=counts))
+
+    # decide which thresholding needs to be used
+    if st_dev <= settings.deviation_threshold:
+        # fixed thresholding
+        threshold = settings.fixed_threshold
+    else:
+        # MCE thresholding, the bins follow from the minimum and maximum ratio as in np.histogram(data, nbins)
+        hist_mce, bins = np.histogram(values, settings.nbins_hybrid, weights=counts)
+        threshold = thresholds.min_cross_entropy_hist(hist_mce, bins)
+
+    return st_dev, threshold
+
+
+def hybrid(hist, threshold):
+    """Calculate the fractional sky cover based on hybrid thresholding, see :meth:`skycover.hybrid`
+
+    Args:
+        hist: joint (B, R) histogram
+        threshold (float): clear sky/cloud threshold determined by the hybrid algorithm
+
+    Returns:
+        float: fractional sky cover as determined by the hybrid thresholding algorithm
+    """
+    values, counts = normalized_ratios(hist)
+
+    clear_sky = np.sum(counts[values > threshold])
+    cloud = np.sum(counts[values < threshold])
+
+    cloud_cover_total = cloud / (clear_sky + cloud)
+
+    return cloud_cover_total
+
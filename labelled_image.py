@@ -1,51 +1,72 @@
 import numpy as np
+import settings
+import buffers
 
 
-def calculate_pixels(labels, red_blue_ratio, threshold):
-    """Get amount of pixels in the four different areas to be used in postprocessing corrections
+def contingency_table(labels, classes, n_labels=settings.n_regions, n_classes=settings.n_classes):
+    """Count the pixels of every combination of region label and pixel class with a single np.bincount
+
+    The counts of all regions and classes follow from one pass over the image, so extra regions or classes do not
+    cost an extra pass.
 
     Args:
-        labels (int): Scalar representation of the segmented image
-        red_blue_ratio (float): ratio of red/blue bands
-        threshold (float): fixed threshold of sunny/cloudy
+        labels: scalar representation (0, 1, 2, ...) of the segmented image, see :meth:`createregions.create`. If
+            None, all pixels are counted in a single region
+        classes: class per image pixel, e.g. settings.class_mask, class_clear, class_thin and class_opaque as given
+            by :meth:`ratio.fixed_classes`
+        n_labels (int): minimum number of region labels
+        n_classes (int): minimum number of classes
 
     Returns:
-        tuple: amount of sunny and cloudy pixels in each of the four regions
+        table of shape (n_labels, n_classes) with the amount of pixels per region label (row) and class (column)
     """
-    # labels == 0 : mask
-    # labels == 1 : outside circle
-    # labels == 2 : horizon are
-    # labels == 3 : inner circle
-    # labels == 4 : sun circle
+    classes = classes.ravel()
+    n_classes = max(n_classes, int(classes.max()) + 1)
+
+    if labels is None:
+        return np.bincount(classes, minlength=n_classes).reshape(1, n_classes)
 
-    # pixels sun circle
-    sun_c = np.sum(((labels == 4) & (red_blue_ratio != 0) & (red_blue_ratio >= threshold)))
-    sun_s = np.sum(((labels == 4) & (red_blue_ratio != 0) & (red_blue_ratio < threshold)))
+    labels = labels.ravel()
+    n_labels = max(n_labels, int(labels.max()) + 1)
 
-    # pixels horizon area
-    horizon_c = np.sum(((labels == 2) & (red_blue_ratio != 0) & (red_blue_ratio >= threshold)))
-    horizon_s = np.sum(((labels == 2) & (red_blue_ratio != 0) & (red_blue_ratio < threshold)))
+    # the labels can be float (see :meth:`createregions.labels_from_regions`), so they are cast into the index first
+    index = buffers.get(labels.shape, np.intp)
+    np.copyto(index, labels, casting='unsafe')
+    index *= n_classes
+    index += classes
 
-    # pixels inner circle
-    inner_c = np.sum(((labels == 3) & (red_blue_ratio != 0) & (red_blue_ratio >= threshold)))
-    inner_s = np.sum(((labels == 3) & (red_blue_ratio != 0) & (red_blue_ratio < threshold)))
+    return np.bincount(index, minlength=n_labels * n_classes).reshape(n_labels, n_classes)
 
-    # pixels outside horizon area and inner circle
-    outside_c = np.sum(((labels == 1) & (red_blue_ratio != 0) & (red_blue_ratio >= threshold)))
-    outside_s = np.sum(((labels == 1) & (red_blue_ratio != 0) & (red_blue_ratio < threshold)))
 
-    showNumberOfPixels = False
-    if showNumberOfPixels:
-        print('sun circle cloudy pixels', sun_c)
-        print('sun circle sunny pixels ', sun_s)
+def pixels(table):
+    """Get amount of pixels in the four different areas from the table of pixels per region and fixed threshold class
 
-        print('horizon area cloudy pixels', horizon_c)
-        print('horizon area sunny pixels ', horizon_s)
+    The clear sky pixels are sunny, the thin and opaque pixels are cloudy, see :meth:`labelled_image.contingency_table`.
 
-        print('inner circle cloudy pixels', inner_c)
-        print('inner circle sunny pixels ', inner_s)
+    Args:
+        table: amount of pixels per region label and class
+
+    Returns:
+        tuple: amount of sunny and cloudy pixels in each of the four regions
+    """
+    # labels 1: outside, 2: horizon area, 3: inner circle, 4: sun circle
+    counts = []
+    for label in range(1, settings.n_regions):
+        cloudy = table[label, settings.class_thin] + table[label, settings.class_opaque]
+        sunny = table[label, settings.class_clear]
+        counts += [cloudy, sunny]
 
-        print('outside cloudy pixels', outside_c)
-        print('outside sunny pixels ', outside_s)
+    return tuple(counts)
 
-    return outside_c, outside_s, horizon_c, horizon_s, inner_c, inner_s, sun_c, sun_s
+
+def calculate_pixels(labels, classes):
+    """Get amount of pixels in the four different areas to be used in postprocessing corrections
+
+    Args:
+        labels (int): Scalar representation of the segmented image
+        classes: fixed threshold class per pixel, see :meth:`classmap.fixed`
+
+    Returns:
+        tuple: amount of sunny and cloudy pixels in each of the four regions
+    """
+    return pixels(contingency_table(labels, classes))
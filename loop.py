@@ -1,160 +1,214 @@
-import mask
 import ratio
-import createregions
 import poster_images
 import skycover
 import thresholds
 import settings
 import cv2
-import overlay
 import labelled_image
 import overview
-import read_properties_file
 import resolution
 import write_to_csv
+import postprocessor
 import os
 import math
-import gzip
+import frame_source
+import tsi_frame
+import buffers
 import statistical_analysis
 import ephem
 import numpy as np
 import time
+import multiprocessing
 from tqdm import tqdm
 import crop
 
 
-def type_TSI(writer):
-    """Loop TSI data structure and features
+def process_TSI_frame(frame):
+    """Process a single TSI frame (properties file, jpg and png)
+
+    This function is self-contained so that it can be carried out by a worker process, see :meth:`loop.type_TSI`.
+
+    Args:
+        frame (tuple): filename without extension, parsed properties file, jpg and png location, as yielded by
+            :meth:`frame_source.frames`
+
+    Returns:
+        tuple: data row to be written to csv, None if the altitude of the sun is too low
+    """
+    # the images are read and decoded and the products are computed on first access
+    frame = tsi_frame.Frame(*frame)
+
+    # the frame-sized arrays are taken from the buffer pool of this (worker) process
+    with buffers.frame():
+        if frame.altitude < settings.minimum_altitude:
+            return None
+
+        # get the fractional sky cover from 'old' TSI software
+        cover_thin_tsi, cover_opaque_tsi, cover_total_tsi = frame.properties.fractional_sky_cover_tsi()
+
+        # calculate fixed fractional skycover
+        cover_thin_fixed, cover_opaque_fixed, cover_total_fixed = frame.fixed_cover
+
+        # calculate hybrid sky cover
+        st_dev, hybrid_threshold = frame.hybrid_threshold
+        cover_total_hybrid = frame.hybrid_cover
+
+        if settings.use_postprocessing:
+            # get some data before doing actual solar/horizon area corrections
+            (outside_c, outside_s, horizon_c, horizon_s,
+             inner_c, inner_s, sun_c, sun_s) = labelled_image.pixels(frame.table)
+
+            if settings.plot_overview:
+                # plot complete overview with 5 different images, histogram and cloud cover comparisons
+                overview.plot(frame.img, frame.img_tsi, frame.segments[0], frame.fixed_overlay,
+                              frame.hybrid_overlay,
+                              frame.azimuth,
+                              frame.sky_ratios, hybrid_threshold, st_dev, frame.filename)
+
+            if settings.plot_poster_images:
+                # plot images for use in poster
+                poster_images.plot(frame.filename, frame.img, frame.img_tsi, frame.fixed_overlay)
+        else:
+            outside_c = outside_s = horizon_c = horizon_s = inner_c = inner_s = sun_c = sun_s = None
+
+        # calculate statistical properties of the image
+        if settings.use_statistical_analysis:
+            energy, entropy, contrast, homogeneity = statistical_analysis.textural_features(frame.img, frame.mask_array)
+        else:
+            energy = entropy = contrast = homogeneity = None
+
+        # prepare data for writing to csv
+        data_row = (frame.filename,
+                    frame.altitude,
+                    frame.azimuth,
+                    cover_thin_fixed, cover_opaque_fixed,
+                    cover_total_fixed,
+                    cover_total_hybrid,
+                    cover_thin_tsi,
+                    cover_opaque_tsi,
+                    cover_total_tsi,
+                    energy,
+                    entropy,
+                    contrast,
+                    homogeneity,
+                    outside_c,
+                    outside_s,
+                    horizon_c,
+                    horizon_s,
+                    inner_c,
+                    inner_s,
+                    sun_c,
+                    sun_s
+                    )
+
+    if settings.report_allocations:
+        print(frame.filename + ': ' + str(buffers.allocations) + ' buffers allocated')
+
+    return data_row
+
+
+def write_TSI_rows(writer, data_rows, correction=None):
+    """Write the processed TSI frames to csv in the order in which they are received
+
+    The date/time of the last frame is printed at most once every settings.progress_interval seconds.
 
     Args:
         writer: csv writing object
+        data_rows: iterable of data rows, None for skipped frames
+        correction: online sun circle/horizon area correction, see :class:`postprocessor.OnlineCorrection`
 
     Returns:
-        n_files: amount of files processed (integer)
+        int: amount of files processed
     """
     filecounter = 0
+    last_progress = 0
 
-    for subdir, dirs, files in os.walk(settings.main_data):
-        dirs.sort()
-        files.sort()
-        for filename in files:
-            if filename.endswith(settings.properties_extension):
-                # unzip the gzip file, open the file as rt=read text
-                with gzip.open(os.path.join(subdir, filename), 'rt') as f:
-                    lines = []
-                    # read the file and store line per line
-                    for line in f:
-                        lines.append(line)
-                    # get the altitude and azimuth from the defs
-                    altitude = read_properties_file.get_altitude(lines)
-                    azimuth = read_properties_file.get_azimuth(lines)
-
-                    if altitude >= settings.minimum_altitude:
-                        filecounter += 1
-                        # get the fractional sky cover from 'old' TSI software
-                        cover_thin_tsi, cover_opaque_tsi, cover_total_tsi = read_properties_file.get_fractional_sky_cover_tsi(
-                            lines)
-
-                        # filename variables
-                        filename_jpg = filename.replace(settings.properties_extension, settings.jpg_extension)
-                        filename_png = filename.replace(settings.properties_extension, settings.png_extension)
-                        filename_no_ext = filename.replace(settings.properties_extension, '')
-
-                        # extract date/time information from the filename
-                        year = filename[0:4]
-                        month = filename[4:6]
-                        day = filename[6:8]
-                        hour = filename[8:10]
-                        minute = filename[10:12]
-                        second = filename[12:13] + '0'
-
-                        print(day + '/' + month + '/' + year + ' ' + hour + ':' + minute + ':' + second, end='\r')
-
-                        # read the image
-                        img = cv2.imread(os.path.join(subdir, filename_jpg))
-                        img_tsi = cv2.imread(os.path.join(subdir, filename_png))
-
-                        # get the resolution of the image
-                        resolution.get_resolution(img)
-
-                        # create and apply the mask
-                        mask_array = mask.create(img, azimuth)
-                        masked_img = mask.apply(img, mask_array)
-
-                        # calculate red/blue ratio per pixel
-                        red_blue_ratio = ratio.red_blue_v2(masked_img)
-
-                        # calculate fixed fractional skycover
-                        fixed_sunny_threshold, fixed_thin_threshold = thresholds.fixed()
-                        cover_thin_fixed, cover_opaque_fixed, cover_total_fixed = skycover.fixed(red_blue_ratio,
-                                                                                                 fixed_sunny_threshold,
-                                                                                                 fixed_thin_threshold)
-
-                        # calculate hybrid sky cover
-                        ratio_br_norm_1d_nz, blue_red_ratio_norm, st_dev, hybrid_threshold = thresholds.hybrid(
-                            masked_img)
-                        cover_total_hybrid = skycover.hybrid(ratio_br_norm_1d_nz, hybrid_threshold)
-
-                        if settings.use_postprocessing:
-                            # create the segments for solar correction
-                            regions, outlines, labels, stencil, image_with_outlines = createregions.create(img, azimuth,
-                                                                                                           altitude,
-                                                                                                           mask_array)
-                            # get some data before doing actual solar/horizon area corrections
-                            outside_c, outside_s, horizon_c, horizon_s, \
-                            inner_c, inner_s, sun_c, sun_s = labelled_image.calculate_pixels(labels, red_blue_ratio,
-                                                                                             fixed_sunny_threshold)
-
-                            # overlay outlines on image(s)
-                            image_with_outlines_fixed = overlay.fixed(red_blue_ratio, outlines, stencil,
-                                                                      fixed_sunny_threshold,
-                                                                      fixed_thin_threshold)
-                            image_with_outlines_hybrid = overlay.hybrid(masked_img, outlines, stencil, hybrid_threshold)
-
-                            if settings.plot_overview:
-                                # plot complete overview with 5 different images, histogram and cloud cover comparisons
-                                overview.plot(img, img_tsi, regions, image_with_outlines_fixed,
-                                              image_with_outlines_hybrid,
-                                              azimuth,
-                                              ratio_br_norm_1d_nz, hybrid_threshold, st_dev, filename_no_ext)
-
-                            if settings.plot_poster_images:
-                                # plot images for use in poster
-                                poster_images.plot(filename_no_ext, img, img_tsi, image_with_outlines_fixed)
-                        else:
-                            outside_c = outside_s = horizon_c = horizon_s = inner_c = inner_s = sun_c = sun_s = None
-
-                        # calculate statistical properties of the image
-                        if settings.use_statistical_analysis:
-                            energy, entropy, contrast, homogeneity = statistical_analysis.textural_features(img)
-                        else:
-                            energy = entropy = contrast = homogeneity = None
-
-                        # prepare data for writing to csv
-                        data_row = (filename_no_ext,
-                                    altitude,
-                                    azimuth,
-                                    cover_thin_fixed, cover_opaque_fixed,
-                                    cover_total_fixed,
-                                    cover_total_hybrid,
-                                    cover_thin_tsi,
-                                    cover_opaque_tsi,
-                                    cover_total_tsi,
-                                    energy,
-                                    entropy,
-                                    contrast,
-                                    homogeneity,
-                                    outside_c,
-                                    outside_s,
-                                    horizon_c,
-                                    horizon_s,
-                                    inner_c,
-                                    inner_s,
-                                    sun_c,
-                                    sun_s
-                                    )
-
-                        write_to_csv.output_data(writer, data_row)
+    for data_row in data_rows:
+        if data_row is None:
+            continue
+
+        filecounter += 1
+
+        if time.monotonic() - last_progress >= settings.progress_interval:
+            last_progress = time.monotonic()
+
+            # extract date/time information from the filename
+            filename_no_ext = data_row[0]
+            year = filename_no_ext[0:4]
+            month = filename_no_ext[4:6]
+            day = filename_no_ext[6:8]
+            hour = filename_no_ext[8:10]
+            minute = filename_no_ext[10:12]
+            second = filename_no_ext[12:13] + '0'
+
+            print(day + '/' + month + '/' + year + ' ' + hour + ':' + minute + ':' + second, end='\r')
+
+        write_to_csv.output_data(writer, data_row)
+
+        if correction is not None:
+            correction.add(data_row)
+
+    return filecounter
+
+
+def sunlit(frames, processed=None):
+    """Skip the frames in which the sun is below settings.minimum_altitude
+
+    Only the properties files of the frames are read at this point, so the images of the skipped frames are never read
+    or sent to a worker process. The skipped frames are added to the manifest, so they are not read again when an
+    interrupted run is resumed.
+
+    Args:
+        frames: frames, see :meth:`frame_source.frames`
+        processed: manifest of processed frames, see :class:`manifest.Manifest`
+
+    Yields:
+        tuple: the frames in which the sun is high enough
+    """
+    for frame in frames:
+        if frame[1].altitude < settings.minimum_altitude:
+            if processed is not None:
+                processed.add(frame[0])
+            continue
+
+        yield frame
+
+
+def type_TSI(writer, processed=None):
+    """Loop TSI data structure and features
+
+    The frames are processed by a pool of settings.n_processes worker processes. The results are collected in
+    filename order, so that the output file is identical to the one of the serial loop (settings.n_processes = 1).
+
+    Frames which are in the manifest of processed frames are skipped, frames in which the sun is too low are added to
+    it, see :meth:`loop.sunlit`. If settings.use_online_correction is set, the sun circle/horizon area corrections
+    are written to settings.corrections_data while the frames are processed.
+
+    Args:
+        writer: csv writing object
+        processed: manifest of processed frames, see :class:`manifest.Manifest`
+
+    Returns:
+        n_files: amount of files processed (integer)
+    """
+    frames = sunlit(frame_source.frames(skip=processed if processed is not None else ()), processed)
+
+    if settings.use_online_correction:
+        correction = postprocessor.OnlineCorrection(settings.corrections_data,
+                                                    processed is not None and processed.resume)
+    else:
+        correction = None
+
+    try:
+        if settings.n_processes > 1:
+            with multiprocessing.Pool(settings.n_processes) as pool:
+                data_rows = pool.imap(process_TSI_frame, frames, chunksize=settings.chunk_size)
+                filecounter = write_TSI_rows(writer, data_rows, correction)
+        else:
+            filecounter = write_TSI_rows(writer, map(process_TSI_frame, frames), correction)
+    finally:
+        if correction is not None:
+            correction.close()
 
     return filecounter
 
@@ -188,15 +242,17 @@ def type_swimcat(writer):
             mean_r, mean_g, mean_b, st_dev, skewness, diff_rg, diff_rb, diff_gb = statistical_analysis.spectral_features(
                 img)
 
+            red_blue_ratio, blue_red_ratio, blue_red_ratio_norm = ratio.compute(img)
+
             # fixed cloud cover
-            red_blue_ratio = ratio.red_blue_v2(img)
             threshold = settings.fixed_threshold_swim
             tmp, tmp, cloud_cover_fixed = skycover.fixed(red_blue_ratio, threshold, threshold)
 
             # decide whether to use hybrid thresholding for this database
             if settings.use_hybrid_SEG:
                 # hybrid cloud cover cloud cover
-                ratio_br_norm_1d_nz, blue_red_ratio_norm, st_dev, threshold = thresholds.hybrid(img)
+                ratio_br_norm_1d_nz, blue_red_ratio_norm, st_dev, threshold = thresholds.hybrid(
+                    blue_red_ratio_norm)
                 cloud_cover_hybrid = skycover.hybrid(ratio_br_norm_1d_nz, threshold)
             else:
                 cloud_cover_hybrid = None
@@ -272,15 +328,17 @@ def type_swimseg(writer):
 
                     resolution.get_resolution(img)
 
+                    red_blue_ratio, blue_red_ratio, blue_red_ratio_norm = ratio.compute(img)
+
                     # fixed cloud cover
-                    red_blue_ratio = ratio.red_blue_v2(img)
                     cloud = np.sum(red_blue_ratio >= settings.fixed_threshold_swim)
                     clear_sky = np.sum(red_blue_ratio < settings.fixed_threshold_swim)
 
                     cloud_cover_fixed = cloud / (cloud + clear_sky)
 
                     # hybrid cloud cover
-                    ratio_br_norm_1d_nz, blue_red_ratio_norm, st_dev, threshold = thresholds.hybrid(img)
+                    ratio_br_norm_1d_nz, blue_red_ratio_norm, st_dev, threshold = thresholds.hybrid(
+                        blue_red_ratio_norm)
                     cloud_cover_hybrid = skycover.hybrid(ratio_br_norm_1d_nz, threshold)
 
                     # prepare data for writing to csv
@@ -370,7 +428,9 @@ def type_mobotix(writer):
                 cv2.line(masked, (840, 475), (720, 70), settings.black, 35)
 
                 # hybrid cloud cover
-                blue_red_ratio_norm_1d_nz, blue_red_ratio_norm, st_dev, threshold = thresholds.hybrid(masked)
+                red_blue_ratio, blue_red_ratio, blue_red_ratio_norm = ratio.compute(masked)
+                blue_red_ratio_norm_1d_nz, blue_red_ratio_norm, st_dev, threshold = thresholds.hybrid(
+                    blue_red_ratio_norm)
                 cloud_cover = skycover.hybrid(blue_red_ratio_norm_1d_nz, threshold)
 
                 # plot.histogram(blue_red_ratio_norm_1d_nz, filename, 'Normalized B/R', 'Frequency', st_dev, threshold)
@@ -405,16 +465,17 @@ def type_mobotix(writer):
     return filecounter
 
 
-def structure(writer):
+def structure(writer, processed=None):
     """Determine and call loop for type of data
 
     Args:
         writer: csv writing object
+        processed: manifest of processed frames (TSI only), see :class:`manifest.Manifest`
     """
     start_time = time.time()
 
     if settings.data_type == settings.tsi_str:
-        n_files = type_TSI(writer)
+        n_files = type_TSI(writer, processed)
 
     elif settings.data_type == settings.cat_str:
         n_files = type_swimcat(writer)
@@ -427,4 +488,5 @@ def structure(writer):
 
     print("Main loop time: %s seconds" % round((time.time() - start_time), 10))
     print('Amount of file processed: %s' % n_files)
-    print("Average time per image: %s seconds" % round((time.time() - start_time) / n_files, 10))
+    if n_files:
+        print("Average time per image: %s seconds" % round((time.time() - start_time) / n_files, 10))
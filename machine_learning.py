@@ -4,6 +4,7 @@ from sklearn.cluster import KMeans
 import pandas as pd
 from tqdm import tqdm
 import settings
+import columnar
 import matplotlib.pyplot as plt
 # style.use('ggplot')
 
@@ -13,7 +14,7 @@ def knn():
     percentage of kNN using cross-validation over a large amount of iterations. Odd numbers of neighbors (m) are
     tested from 3 to 17."""
     # read input values
-    df = pd.read_csv(settings.output_data)
+    df = pd.DataFrame(columnar.read(settings.output_data))
     # replace all question marks with -99999
     df.replace('?', -99999, inplace=True)
     # drop the first column
@@ -47,7 +48,7 @@ def k_means():
     """Implementation of the k-means machine learning algorithm. The SKLearn Python library is used used for the main
     processing and calculations. K-means clusters the n-dimensional data into n groups. Data is read from a file."""
     # read input values
-    df = pd.read_csv(settings.output_data)
+    df = pd.DataFrame(columnar.read(settings.output_data))
     # replace all question marks with -99999
     df.replace('?', -99999, inplace=True)
     # drop the first column
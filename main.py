@@ -9,6 +9,9 @@ import machine_learning
 import plot
 import crop
 import image_interface
+import manifest
+import columnar
+import os
 
 
 def main():
@@ -18,19 +21,70 @@ def main():
     are carried out (specified in settings file). Finally, some plotting functions are called.
     """
 
+    # the corrections are written by the processing loop, unless it only processed a part of the frames
+    corrected_online = False
+
     if settings.use_processing_loop:
-        with open(settings.output_data, 'w') as fd:
-            writer = csv.writer(fd, delimiter=settings.delimiter)
+        # continue an interrupted run by appending to the existing output file
+        resume = settings.resume_processing_loop and os.path.exists(settings.output_data)
+
+        if resume and settings.output_format == 'feather':
+            raise Exception('Resuming the processing loop is only possible with csv output')
+
+        if resume and settings.data_type != settings.tsi_str:
+            raise Exception('Resuming the processing loop is only possible with TSI data')
+
+        online_correction = settings.use_online_correction and settings.data_type == settings.tsi_str
+        if online_correction and not settings.use_postprocessing:
+            raise Exception('The online correction needs the pixel counts of the postprocessing (use_postprocessing)')
+
+        if resume:
+            # remove a half-written row
+            last_row = manifest.repair(settings.output_data).decode()
+            # nothing to resume if not even the headers were written
+            resume = last_row != ''
+
+        processed = manifest.Manifest(settings.output_manifest, resume)
+
+        if resume:
+            # the rows of the last batch can be written just before the crash, without being added to the manifest. The
+            # batches are written in order, so only the rows after the last row in the manifest are read
+            with open(settings.output_data, 'rb') as f:
+                for line in manifest.reversed_lines(f):
+                    filename = line.decode().split(settings.delimiter, 1)[0]
+
+                    if filename in processed or filename == 'filename':
+                        break
+                    if filename:
+                        processed.add(filename)
+
+        # the rows are written on a background thread, the manifest is updated after every written batch
+        if settings.output_format == 'feather':
+            # the file is closed after an exception as well, so the rows written so far can be read
+            with columnar.ColumnarWriter(settings.output_data) as writer:
+                with write_to_csv.AsyncWriter(writer, processed=processed) as async_writer:
+                    loop.structure(async_writer, processed)
+        else:
+            # a row which is half-written by a crash is removed when resuming, see manifest.repair
+            with open(settings.output_data, 'a' if resume else 'w') as fd:
+                writer = csv.writer(fd, delimiter=settings.delimiter)
+
+                if not resume:
+                    write_to_csv.headers(writer)
+                    fd.flush()
+
+                with write_to_csv.AsyncWriter(writer, fd, processed) as async_writer:
+                    loop.structure(async_writer, processed)
 
-            write_to_csv.headers(writer)
+        processed.close()
 
-            loop.structure(writer)
+        corrected_online = online_correction and not resume
 
-            # rename file
-            copyfile(settings.output_data, settings.output_data_copy)
+        # rename file
+        copyfile(settings.output_data, settings.output_data_copy)
 
     # postprocessing step which carries out corrections for solar/horizon area
-    if settings.use_postprocessing:
+    if settings.use_postprocessing and not corrected_online:
         postprocessor.aerosol_correction()
 
     if settings.use_machine_learning:
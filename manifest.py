@@ -0,0 +1,123 @@
+"""Manifest of the frames that are completely processed and written to the output file.
+
+The manifest makes it possible to resume an interrupted processing loop (settings.resume_processing_loop): frames that
+are already in the manifest are skipped and new rows are appended to the existing output file. The frames which are
+skipped because the sun is too low are in the manifest as well, but have no row in the output file.
+
+The output file can be several GB, so it is only read backwards from the end, as far as needed.
+"""
+import os
+import threading
+
+# size (bytes) of the blocks in which a file is read backwards, see :meth:`manifest.reversed_lines`
+block_size = 1 << 16
+
+
+def reversed_lines(f):
+    """Read the lines of a file backwards, starting at the end of the file
+
+    The first line yielded is the part after the last newline, which is empty if the file ends with a newline.
+
+    Args:
+        f: file opened in binary mode
+
+    Yields:
+        bytes: the lines without newline, from the last to the first
+    """
+    position = f.seek(0, os.SEEK_END)
+    rest = b''
+
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+
+        lines = (f.read(size) + rest).split(b'\n')
+        rest = lines[0]
+        yield from reversed(lines[1:])
+
+    yield rest
+
+
+def repair(path):
+    """Remove a half-written last line from a file, which can be left behind by a crash
+
+    Only the end of the file is read.
+
+    Args:
+        path (str): location of the file
+
+    Returns:
+        bytes: the last complete line of the file, empty if there is none
+    """
+    with open(path, 'rb+') as f:
+        lines = reversed_lines(f)
+        size = f.seek(0, os.SEEK_END)
+
+        half_written = next(lines)
+        if half_written:
+            f.truncate(size - len(half_written))
+
+        # the first line of the file is only complete if it ends with a newline
+        last_line = next(lines, None)
+
+    if last_line is None:
+        return b''
+
+    return last_line + b'\n'
+
+
+class Manifest:
+    """Set of processed filenames which is stored line by line in a file
+
+    Args:
+        path (str): location of the manifest file
+        resume (bool): continue with the existing manifest in stead of starting a new one
+    """
+    def __init__(self, path, resume):
+        self.path = path
+        self.resume = resume
+        self.completed = set()
+
+        # the filenames are added by the writer thread and by the processing loop (skipped frames)
+        self.lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            repair(path)
+            with open(path) as f:
+                self.completed.update(line.rstrip('\n') for line in f)
+        else:
+            open(path, 'w').close()
+
+        # line buffered, so every filename is written as soon as it is added
+        self.file = open(path, 'a', buffering=1)
+
+    def __contains__(self, filename):
+        return filename in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def add(self, filename):
+        """Add a filename to the manifest
+
+        Args:
+            filename (str): filename without extension
+        """
+        self.update([filename])
+
+    def update(self, filenames):
+        """Add several filenames to the manifest at once
+
+        Args:
+            filenames: iterable of filenames without extension
+        """
+        with self.lock:
+            new = [filename for filename in filenames if filename not in self.completed]
+
+            if new:
+                self.completed.update(new)
+                self.file.write(''.join(filename + '\n' for filename in new))
+
+    def close(self):
+        self.file.close()
@@ -1,8 +1,16 @@
 import settings
+from functools import lru_cache
 from math import cos, sin, pi
 import numpy as np
 import cv2 as cv2
 
+# static parts of the mask per resolution, see :meth:`mask.static`
+_static_masks = {}
+
+# amount of (rounded) azimuths of which the mask and the sky index are cached, consecutive frames have almost the same
+# azimuth so only the most recent ones are kept
+cache_size = 16
+
 
 def calculate_band_position(theta):
     """Calculate the inner and outer position of the shadow band, required for drawing the shadow band mask line.
@@ -25,27 +33,45 @@ def calculate_band_position(theta):
     return x_inner, y_inner, x_outer, y_outer
 
 
-def create(img, azimuth):
-    """Create the mask using the original image and the azimuth.
+def static(shape):
+    """Get the part of the mask which does not depend on the position of the sun, cached per resolution
 
-    The mask consists of three parts:
-
-    * The circle bordering the hemispherical mirror.
-    * The shadow band.
-    * The camera and camera arm.
+    The static part consists of the circle bordering the hemispherical mirror and the camera and camera arm.
 
     Args:
-        img: Image in NumPy format
-        azimuth (float): Azimuth of the sun, taken from the properties file
+        shape (tuple): resolution (rows, columns) of the image
 
     Returns:
-        int: The masked image of shape (x_resolution,y_resolution,3) for an RGB image
+        boolean array, True for the pixels which are not masked
     """
-    mask_array = np.zeros(img.shape, dtype="uint8")
+    if shape not in _static_masks:
+        mask_array = np.zeros(shape, dtype=np.uint8)
+
+        # HEMISPHERE
+        # draw a white circle on the mask
+        cv2.circle(mask_array, (int(settings.x / 2), int(settings.y / 2)), settings.radius_circle, 1, -1)
+
+        # ARM + CAMERA
+        cv2.rectangle(mask_array, (141, 190), (154, 153), 0, -1)
+        cv2.rectangle(mask_array, (145, 154), (152, 91), 0, -1)
+        cv2.rectangle(mask_array, (int(settings.x / 2), 91), (152, 26), 0, -1)
+
+        _static_masks[shape] = mask_array.astype(bool)
 
-    # HEMISPHERE
-    # draw a white circle on the mask
-    cv2.circle(mask_array, (int(settings.x / 2), int(settings.y / 2)), settings.radius_circle, settings.white, -1)
+    return _static_masks[shape]
+
+
+def band(shape, azimuth):
+    """Get the mask of the shadow band
+
+    Args:
+        shape (tuple): resolution (rows, columns) of the image
+        azimuth (float): azimuth of the sun
+
+    Returns:
+        boolean array, False for the pixels covered by the shadow band
+    """
+    mask_array = np.ones(shape, dtype=np.uint8)
 
     # SHADOWBAND
     # first calculate the position of the shadow band
@@ -60,26 +86,83 @@ def create(img, azimuth):
     x_inner, y_inner, x_outer, y_outer = calculate_band_position(theta)
 
     # draw a black line on the mask
-    cv2.line(mask_array, (x_inner, y_inner), (x_outer, y_outer), settings.black, 35)
+    cv2.line(mask_array, (x_inner, y_inner), (x_outer, y_outer), 0, settings.band_thickness)
+
+    return mask_array.astype(bool)
+
+
+def create(img, azimuth):
+    """Create the mask using the original image and the azimuth.
+
+    The mask consists of three parts:
+
+    * The circle bordering the hemispherical mirror.
+    * The shadow band.
+    * The camera and camera arm.
+
+    The static parts are drawn once per resolution. The masks of the most recent azimuths are cached, the azimuth is
+    rounded to a multiple of settings.mask_azimuth_step degrees (0: the exact azimuth is used and the mask is not
+    cached).
+
+    Args:
+        img: Image in NumPy format
+        azimuth (float): Azimuth of the sun, taken from the properties file
+
+    Returns:
+        boolean array of shape (x_resolution,y_resolution), True for the pixels which are not masked
+    """
+    shape = img.shape[:2]
+
+    if not settings.mask_azimuth_step:
+        return np.logical_and(static(shape), band(shape, azimuth))
+
+    return _cached_mask(shape, round(azimuth / settings.mask_azimuth_step) * settings.mask_azimuth_step)
+
+
+@lru_cache(maxsize=cache_size)
+def _cached_mask(shape, azimuth):
+    """Mask of a resolution and rounded azimuth, see :meth:`mask.create`"""
+    return np.logical_and(static(shape), band(shape, azimuth))
+
+
+def sky_index(img, azimuth):
+    """Get the flat index of the pixels which are not masked, cached like the masks, see :meth:`mask.create`
+
+    Args:
+        img: Image in NumPy format
+        azimuth (float): Azimuth of the sun, taken from the properties file
+
+    Returns:
+        sorted flat index of the pixels which are not masked
+    """
+    if not settings.mask_azimuth_step:
+        return np.flatnonzero(create(img, azimuth))
+
+    return _cached_sky_index(img.shape[:2], round(azimuth / settings.mask_azimuth_step) * settings.mask_azimuth_step)
 
-    # ARM + CAMERA
-    cv2.rectangle(mask_array, (141, 190), (154, 153), settings.black, -1)
-    cv2.rectangle(mask_array, (145, 154), (152, 91), settings.black, -1)
-    cv2.rectangle(mask_array, (int(settings.x / 2), 91), (152, 26), settings.black, -1)
 
-    return mask_array
+@lru_cache(maxsize=cache_size)
+def _cached_sky_index(shape, azimuth):
+    """Flat index of the sky pixels of a resolution and rounded azimuth, see :meth:`mask.sky_index`"""
+    return np.flatnonzero(_cached_mask(shape, azimuth))
 
 
-def apply(img, mask_array):
+def apply(img, mask_array, out=None):
     """Apply mask to image
 
     Args:
         img: image to be masked
-        mask_array: array of masking values
+        mask_array: boolean mask, see :meth:`mask.create`
+        out: preallocated array for the masked image, see :meth:`buffers.get`
 
     Returns:
         masked image
     """
-    masked_img = cv2.bitwise_and(img, mask_array)
+    # copy the pixels which are not masked to a new (zero) image, the boolean mask is used as uint8 mask without copying
+    if out is None:
+        masked_img = cv2.copyTo(img, mask_array.view(np.uint8))
+    else:
+        out.fill(0)
+        masked_img = cv2.copyTo(img, mask_array.view(np.uint8), out)
 
     return masked_img
@@ -1,14 +1,16 @@
 import numpy as np
 from matplotlib import pyplot as plt
 import settings
+import columnar
 
 
 def plot(img, imgTSI, regions, imageWithOutlines, imageWithOutlinesHYTA, azimuth, flatNormalizedRatioBRNoZeros,
          threshold, st_dev, filename):
     current_azimuth = azimuth
 
-    data = np.genfromtxt('output_data/dataTSI.csv', delimiter=settings.delimiter, names=True)
-    corrections = np.genfromtxt('output_data/corrections.csv', delimiter=settings.delimiter, names=True)
+    data = columnar.read(settings.output_data_copy, ['azimuth', 'cloud_cover_TSI', 'cloud_cover_fixed',
+                                                     'cloud_cover_hybrid'])
+    corrections = np.genfromtxt(settings.corrections_data, delimiter=settings.delimiter, names=True)
     # mobotix = np.genfromtxt('/nobackup/users/mos/testing/mobotix/mobotix_cloud_cover.csv', delimiter='\t')
 
     plt.figure(figsize=(16, 9))
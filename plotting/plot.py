@@ -1,4 +1,6 @@
 import settings
+import columnar
+import classmap
 import matplotlib.pyplot as plt
 import numpy as np
 import cv2 as cv2
@@ -34,7 +36,7 @@ def histogram_obj(ax, data, plot_title, x_label, y_label, st_dev, threshold):
 
 
 def difference_histogram():
-    data = np.genfromtxt(settings.output_data_copy, delimiter=settings.delimiter, names=True, dtype=None)
+    data = columnar.read(settings.output_data_copy, ['cloud_cover_TSI', 'cloud_cover_fixed', 'cloud_cover_hybrid'])
 
     nbins = 25
 
@@ -59,19 +61,16 @@ def difference_histogram():
     plt.close()
 
 
-def binary_obj(ax, data, plot_title, threshold):
+def binary_obj(ax, classes, plot_title):
     """Binary image object
 
     Args:
-        data: input data (2D array)
+        classes: hybrid class per pixel (2D array), see :meth:`classmap.hybrid`
         plot_title: title of the image
-        threshold: threshold value, used in cloud/clear sky coloring
     """
-    data_copy = data
-
-    data[np.logical_and(data_copy >= threshold, data_copy != settings.mask_value)] = 2  # sun
-    data[np.logical_and(data_copy < threshold, data_copy != settings.mask_value)] = 1  # clouds
-    data[data_copy == settings.mask_value] = 0  # mask
+    # mask: 0, clouds: 1, sun: 2
+    data = np.where(classes == settings.class_clear, 2, 1)
+    data[classes == settings.class_mask] = 0
 
     mynorm = plt.Normalize(vmin=1, vmax=2)
 
@@ -124,7 +123,7 @@ def original_and_binary_and_histogram(img, filename, data1, title1, data2, title
 
     ax1.imshow(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
 
-    binary_obj(ax2, data1, title1, threshold)
+    binary_obj(ax2, classmap.hybrid(data1, threshold), title1)
     histogram_obj(ax3, data2, title2, x_label2, y_label2, st_dev, threshold)
 
     plt.tight_layout()
@@ -134,24 +133,13 @@ def original_and_binary_and_histogram(img, filename, data1, title1, data2, title
 
 def comparison_scatter():
     """Plot the scatter of two datasets against each other with a 1:1 line, best fit and r2 score."""
-    data = np.genfromtxt(settings.output_data_copy, delimiter=settings.delimiter, names=True, dtype=None)
+    data = columnar.read(settings.output_data_copy, ['filename', 'cloud_cover_TSI', 'cloud_cover_hybrid'])
 
     x = data['cloud_cover_TSI']
     y = data['cloud_cover_hybrid']
-    names = data['filename']
 
     # convert 1D filename array to string
-    # if there is an extension (.jpg/.png etc.) or the file name consists of a combination between letters and numbers
-    # the filenames are read as 'byte' type. In this case, a conversion ('decode') has to be carried out.
-    # in the case of an integer filename type (0001, 0002, 201805021645 etc.) a more simple conversion is applied
-    names_str = []
-    if names.dtype == np.dtype(int):
-        for name in names:
-            names_str.append(str(name))
-    else:
-        for name in names:
-            names_str.append(name.decode('UTF-8'))
-    names = names_str
+    names = [str(name) for name in data['filename']]
 
     # Calculate the point density
     xy = np.vstack([x, y])
@@ -2,29 +2,56 @@ import numpy as np
 from plotcorrectionresult import plot_correction_results
 import csv as csv
 import settings
+import columnar
+import write_to_csv
+import manifest
+import os
+from numpy.lib.stride_tricks import sliding_window_view
+from collections import deque
+import multiprocessing
 
+# columns of the cloudy/sunny pixel counts in the TSI output data
+count_columns = ['outside_c', 'outside_s', 'horizon_c', 'horizon_s', 'inner_c', 'inner_s', 'sun_c', 'sun_s']
 
-def aerosol_correction():
-    """Perform the horizon area/sun circle correction.
+# headers of the output file of the corrections
+headers = ['azimuth', 'corrected_sky_cover', 'smooth_corrected_sky_cover']
 
-    The data from the main processing loop is used which is then subjected to a few steps. The approach by Long 2010
-    is used. Several statistical features of the segmetns are tested against a set of thresholds defined in
-    :meth:`settings`. Subsequently, the corrected sky cover percentages are written to a file.
+
+def centered_window(function, data, width, edges):
+    """Apply a statistic to the centered moving window data[i - width:i + width] of every sample i
+
+    The windows are strided views of the data, so the statistic is evaluated for all samples in one NumPy call.
+
+    Args:
+        function: NumPy reduction which accepts an axis argument, e.g. np.std or np.mean
+        data: time series (NumPy array)
+        width (int): half width of the window
+        edges: values of the first and last width samples, which do not have a complete window
+
+    Returns:
+        NumPy array with the statistic of every window
     """
-    # read columns of file
-    df = np.genfromtxt(settings.output_data_copy, skip_header=1, delimiter=settings.delimiter)
+    result = np.copy(edges)
+    n_samples = len(data)
+
+    if n_samples > 2 * width:
+        windows = sliding_window_view(data, 2 * width)
+        result[width:n_samples - width] = function(windows[:n_samples - 2 * width], axis=1)
+
+    return result
 
-    azimuth = df[:, 2]
-    outside_c = df[:, 14]
-    outside_s = df[:, 15]
-    horizon_c = df[:, 16]
-    horizon_s = df[:, 17]
-    inner_c = df[:, 18]
-    inner_s = df[:, 19]
-    sun_c = df[:, 20]
-    sun_s = df[:, 21]
 
-    n_samples = len(df[:, 0])
+def sky_covers(counts):
+    """Calculate the sky cover of the whole image and of the sun circle, horizon area and the remainder
+
+    Args:
+        counts: cloudy and sunny pixel counts per frame, NumPy array with the columns outside_c, outside_s,
+            horizon_c, horizon_s, inner_c, inner_s, sun_c and sun_s (see :meth:`labelled_image.pixels`)
+
+    Returns:
+        tuple: original sky cover, individual sun circle and horizon area sky covers and remainder sky cover
+    """
+    outside_c, outside_s, horizon_c, horizon_s, inner_c, inner_s, sun_c, sun_s = counts.T
 
     # total amount of sun and cloud pixels
     sun = np.add(sun_s, np.add(horizon_s, np.add(inner_s, outside_s)))
@@ -44,6 +71,29 @@ def aerosol_correction():
     # first guess
     remainder_sky_cover = np.subtract(original_sky_cover, np.add(sun_sky_cover_partial, horizon_sky_cover_partial))
 
+    return original_sky_cover, sun_sky_cover_indiv, horizon_sky_cover_indiv, remainder_sky_cover
+
+
+def correct(counts, sun_st_dev, remainder_st_dev, horizon_st_dev):
+    """Correct the sky cover for the sun circle and horizon area if the criteria of Long 2010 match
+
+    Args:
+        counts: cloudy and sunny pixel counts per frame, see :meth:`postprocessor.sky_covers`
+        sun_st_dev: standard deviation of the sun circle sky cover in the window around each frame
+        remainder_st_dev: standard deviation of the remainder sky cover in the window around each frame
+        horizon_st_dev: standard deviation of the horizon area sky cover in the window around each frame
+
+    Returns:
+        tuple: original and corrected sky cover
+    """
+    outside_c, outside_s, horizon_c, horizon_s, inner_c, inner_s, sun_c, sun_s = counts.T
+
+    original_sky_cover, sun_sky_cover_indiv, horizon_sky_cover_indiv, remainder_sky_cover = sky_covers(counts)
+
+    # total amount of sun and cloud pixels
+    sun = np.add(sun_s, np.add(horizon_s, np.add(inner_s, outside_s)))
+    cloud = np.add(sun_c, np.add(horizon_c, np.add(inner_c, outside_c)))
+
     initial_adjustment_factor = np.subtract(1, remainder_sky_cover)
 
     initial_adjustment_factor = np.where(initial_adjustment_factor > settings.initial_adjustment_factor_limit,
@@ -52,15 +102,6 @@ def aerosol_correction():
 
     first_guess = np.multiply(sun_c, initial_adjustment_factor)
 
-    # calculate standard deviations
-    sun_st_dev = np.zeros(n_samples)
-    remainder_st_dev = np.zeros(n_samples)
-    horizon_st_dev = np.zeros(n_samples)
-    for i in range(0 + settings.st_dev_width, n_samples - settings.st_dev_width):
-        sun_st_dev[i] = np.std(sun_sky_cover_indiv[i - settings.st_dev_width:i + settings.st_dev_width])
-        remainder_st_dev[i] = np.std(remainder_sky_cover[i - settings.st_dev_width:i + settings.st_dev_width])
-        horizon_st_dev[i] = np.std(horizon_sky_cover_indiv[i - settings.st_dev_width:i + settings.st_dev_width])
-
     cloud_corrected = np.copy(cloud)
     sun_corrected = np.copy(sun)
 
@@ -98,18 +139,105 @@ def aerosol_correction():
     # corrected sky cover
     corrected_sky_cover = np.divide(cloud_corrected, (sun_corrected + cloud_corrected))
 
+    return original_sky_cover, corrected_sky_cover
+
+
+def correct_series(counts):
+    """Correct a continuous time series of frames, e.g. the frames of one day
+
+    Args:
+        counts: cloudy and sunny pixel counts per frame, see :meth:`postprocessor.sky_covers`
+
+    Returns:
+        tuple: corrected and smooth corrected sky cover
+    """
+    n_samples = len(counts)
+
+    original_sky_cover, sun_sky_cover_indiv, horizon_sky_cover_indiv, remainder_sky_cover = sky_covers(counts)
+
+    # calculate standard deviations
+    sun_st_dev = centered_window(np.std, sun_sky_cover_indiv, settings.st_dev_width, np.zeros(n_samples))
+    remainder_st_dev = centered_window(np.std, remainder_sky_cover, settings.st_dev_width, np.zeros(n_samples))
+    horizon_st_dev = centered_window(np.std, horizon_sky_cover_indiv, settings.st_dev_width, np.zeros(n_samples))
+
+    # corrected sky cover
+    original_sky_cover, corrected_sky_cover = correct(counts, sun_st_dev, remainder_st_dev, horizon_st_dev)
+
     difference = np.subtract(original_sky_cover, corrected_sky_cover)
 
     # smoothing
-    running_mean = np.copy(difference)
-
-    for i in range(0 + settings.smoothing_width, n_samples - settings.smoothing_width):
-        running_mean[i] = np.mean(difference[i - settings.smoothing_width:i + settings.smoothing_width])
+    running_mean = centered_window(np.mean, difference, settings.smoothing_width, difference)
 
     smooth_corrected_sky_cover = original_sky_cover - running_mean
 
     smooth_corrected_sky_cover[smooth_corrected_sky_cover < 0] = 0
 
+    return corrected_sky_cover, smooth_corrected_sky_cover
+
+
+def day(filename):
+    """Get the observation day of a frame from its filename, e.g. 20160601 for 2016060104490
+
+    Args:
+        filename (str): filename without extension
+
+    Returns:
+        str: day of the observation
+    """
+    return filename[0:8]
+
+
+def split_days(filenames):
+    """Get the start and end index of the consecutive frames that belong to the same observation day
+
+    Args:
+        filenames: filenames without extension, in the order of the output data
+
+    Returns:
+        list: (start, end) index per day
+    """
+    days = np.array([day(filename) for filename in filenames])
+
+    # indices where a new day starts
+    boundaries = np.flatnonzero(days[1:] != days[:-1]) + 1
+
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(days)]))
+
+    return list(zip(starts, ends))
+
+
+def aerosol_correction():
+    """Perform the horizon area/sun circle correction.
+
+    The data from the main processing loop is used which is then subjected to a few steps. The approach by Long 2010
+    is used. Several statistical features of the segmetns are tested against a set of thresholds defined in
+    :meth:`settings`. Subsequently, the corrected sky cover percentages are written to a file.
+
+    If settings.correct_per_day is set, every observation day is corrected separately, so the moving windows never
+    cross the gap between two days. The days are then corrected by a pool of settings.n_processes worker processes.
+    """
+    # read columns of file
+    data = columnar.read(settings.output_data_copy, ['filename', 'azimuth'] + count_columns, settings.tsi_str)
+
+    azimuth = data['azimuth']
+    counts = np.column_stack([data[name] for name in count_columns]).astype(float)
+
+    if settings.correct_per_day:
+        series = [counts[start:end] for start, end in split_days(data['filename'])]
+    else:
+        series = [counts]
+
+    if settings.n_processes > 1 and len(series) > 1:
+        with multiprocessing.Pool(settings.n_processes) as pool:
+            results = pool.map(correct_series, series)
+    else:
+        results = list(map(correct_series, series))
+
+    # merge the days in their original order
+    corrected_sky_cover = np.concatenate([result[0] for result in results])
+    smooth_corrected_sky_cover = np.concatenate([result[1] for result in results])
+
     # plot
     if settings.plot_correction_result:
         plot_correction_results(corrected_sky_cover, smooth_corrected_sky_cover)
@@ -117,8 +245,181 @@ def aerosol_correction():
     # zip data and put into file
     rows = zip(azimuth, corrected_sky_cover, smooth_corrected_sky_cover)
 
-    with open(settings.project_folder + 'cloud_detection/cloudDetection/output_data/corrections.csv', 'w') as f:
+    with open(settings.corrections_data, 'w') as f:
         writer = csv.writer(f, delimiter=settings.delimiter)
-        writer.writerow(['azimuth', 'corrected_sky_cover', 'smooth_corrected_sky_cover'])
+        writer.writerow(headers)
         for row in rows:
             writer.writerow(row)
+
+
+class CenteredWindow:
+    """Ring buffer which releases the samples of a time series together with their centered window
+
+    The window of sample i is data[i - width:i + width], as in :meth:`postprocessor.centered_window`. A sample is
+    released as soon as sample i + width is added, since only then it is known that sample i has a complete window.
+    The first and last width samples are released without window (None).
+
+    Args:
+        width (int): half width of the window
+    """
+    def __init__(self, width):
+        self.width = width
+        self.samples = deque(maxlen=2 * width + 1)
+        self.n_samples = 0
+
+    def add(self, sample):
+        """Add a sample to the time series
+
+        Args:
+            sample: any object
+
+        Returns:
+            list: released (sample, window) pairs
+        """
+        self.samples.append(sample)
+        self.n_samples += 1
+
+        # index of the sample that is released
+        i = self.n_samples - 1 - self.width
+        if i < 0:
+            return []
+
+        position = len(self.samples) - 1 - self.width
+        if i >= self.width:
+            window = list(self.samples)[position - self.width:position + self.width]
+        else:
+            window = None
+
+        return [(self.samples[position], window)]
+
+    def flush(self):
+        """End the time series and release the last samples
+
+        Returns:
+            list: released (sample, window) pairs
+        """
+        n_remaining = min(self.width, self.n_samples)
+        released = [(sample, None) for sample in list(self.samples)[len(self.samples) - n_remaining:]]
+
+        self.samples.clear()
+        self.n_samples = 0
+
+        return released
+
+
+class OnlineCorrection:
+    """Horizon area/sun circle correction of frames as they are processed, see :meth:`postprocessor.aerosol_correction`
+
+    The frames are kept in ring buffers of the size of the standard deviation and smoothing windows. The corrected sky
+    cover of a frame is written settings.st_dev_width frames later, the smooth corrected sky cover
+    settings.smoothing_width frames after that. If settings.correct_per_day is set, the buffers are emptied when the
+    first frame of a new day arrives. The output file is identical to the one of the postprocessing step.
+
+    When an interrupted run is resumed, the corrections are appended to the existing output file, like the rows of the
+    processing loop. The buffers start empty again, so the corrections are recalculated by the postprocessing step
+    after the run, see :meth:`main.main`.
+
+    Args:
+        path (str): location of the output file of the corrections
+        resume (bool): append to the existing output file in stead of starting a new one
+    """
+    def __init__(self, path, resume=False):
+        # a row which is half-written by a crash is removed when resuming, see manifest.repair
+        resume = resume and os.path.exists(path) and manifest.repair(path) != b''
+
+        # line buffered, so the corrections are available as soon as they are written
+        self.file = open(path, 'a' if resume else 'w', buffering=1)
+        self.writer = csv.writer(self.file, delimiter=settings.delimiter)
+
+        if not resume:
+            self.writer.writerow(headers)
+
+        self.frames = CenteredWindow(settings.st_dev_width)
+        self.differences = CenteredWindow(settings.smoothing_width)
+
+        # positions of the columns in the data rows
+        names = [name for name, dtype in write_to_csv.schema(settings.tsi_str)]
+        self.azimuth_index = names.index('azimuth')
+        self.count_indices = [names.index(name) for name in count_columns]
+
+        # observation day of the frames in the buffers
+        self.day = None
+
+    def add(self, data_row):
+        """Add a processed frame
+
+        Args:
+            data_row: row of the TSI output data, see :meth:`loop.process_TSI_frame`
+        """
+        if settings.correct_per_day:
+            if self.day is not None and day(data_row[0]) != self.day:
+                self.flush()
+            self.day = day(data_row[0])
+
+        counts = [data_row[index] for index in self.count_indices]
+
+        for frame, window in self.frames.add((data_row[self.azimuth_index], counts)):
+            self.correct(frame, window)
+
+    def correct(self, frame, window):
+        """Correct the sky cover of a frame using the standard deviations in its window
+
+        Args:
+            frame: azimuth and pixel counts of the frame
+            window: azimuth and pixel counts of the frames in the window, None if the window is not complete
+        """
+        azimuth, counts = frame
+
+        if window is None:
+            sun_st_dev = remainder_st_dev = horizon_st_dev = 0
+        else:
+            original_sky_cover, sun_sky_cover_indiv, horizon_sky_cover_indiv, remainder_sky_cover = \
+                sky_covers(np.array([counts for azimuth_window, counts in window], dtype=float))
+
+            sun_st_dev = np.std(sun_sky_cover_indiv)
+            remainder_st_dev = np.std(remainder_sky_cover)
+            horizon_st_dev = np.std(horizon_sky_cover_indiv)
+
+        original_sky_cover, corrected_sky_cover = correct(np.array([counts], dtype=float),
+                                                          sun_st_dev, remainder_st_dev, horizon_st_dev)
+
+        difference = np.subtract(original_sky_cover, corrected_sky_cover)
+
+        for sample, window in self.differences.add((azimuth, original_sky_cover[0], corrected_sky_cover[0],
+                                                    difference[0])):
+            self.smooth(sample, window)
+
+    def smooth(self, sample, window):
+        """Smooth the correction of a frame and write the corrected sky covers
+
+        Args:
+            sample: azimuth, original sky cover, corrected sky cover and difference of the frame
+            window: samples in the window, None if the window is not complete
+        """
+        azimuth, original_sky_cover, corrected_sky_cover, difference = sample
+
+        if window is None:
+            running_mean = difference
+        else:
+            running_mean = np.mean([sample[3] for sample in window])
+
+        smooth_corrected_sky_cover = original_sky_cover - running_mean
+
+        if smooth_corrected_sky_cover < 0:
+            smooth_corrected_sky_cover = 0
+
+        self.writer.writerow((azimuth, corrected_sky_cover, smooth_corrected_sky_cover))
+
+    def flush(self):
+        """Correct the remaining frames in the buffers, which do not have a complete window"""
+        for frame, window in self.frames.flush():
+            self.correct(frame, window)
+
+        for sample, window in self.differences.flush():
+            self.smooth(sample, window)
+
+    def close(self):
+        """Correct the remaining frames and close the output file"""
+        self.flush()
+
+        self.file.close()
@@ -1,6 +1,13 @@
 import numpy as np
 import settings
 import sys
+import classmap
+import buffers
+
+# lookup tables for 8-bit images, built on first use
+_tables = None
+_classes_table = None
+_classes_thresholds = None
 
 
 def red_blue(img):
@@ -30,11 +37,12 @@ def red_blue(img):
     return red_blue_ratio
 
 
-def red_blue_v2(img):
+def red_blue_v2(img, out=None):
     """Second version (maybe a better one) of the v1 algorithm
 
     Args:
         img: input image
+        out: preallocated float array for the ratios, see :meth:`buffers.get`
 
     Returns:
         float: red/blue ratio per image pixel
@@ -45,17 +53,22 @@ def red_blue_v2(img):
     # rule out zeros
     mask = np.logical_and(blue_band > 0, red_band > 0)
 
-    red_blue_ratio = np.zeros([settings.y, settings.x])
-    red_blue_ratio[mask] = np.divide(red_band[mask], blue_band[mask])
+    if out is None:
+        red_blue_ratio = np.zeros([settings.y, settings.x])
+    else:
+        red_blue_ratio = out
+        red_blue_ratio.fill(0)
+    np.divide(red_band, blue_band, out=red_blue_ratio, where=mask)
 
     return red_blue_ratio
 
 
-def blue_red(img):
+def blue_red(img, out=None):
     """Calculate the blue/red ratio per image pixel
 
     Args:
         img: input image
+        out: preallocated float array for the ratios, see :meth:`buffers.get`
 
     Returns:
         blue/red ratio per image pixel
@@ -66,10 +79,152 @@ def blue_red(img):
     # rule out zeros
     mask = np.logical_and(blue_band > 0, red_band > 0)
 
-    if settings.data_type == settings.tsi_str:
+    if out is not None:
+        blue_red_ratio = out
+        blue_red_ratio.fill(0)
+    elif settings.data_type == settings.tsi_str:
         blue_red_ratio = np.zeros([settings.y, settings.x])
     else:
         blue_red_ratio = np.zeros([settings.x, settings.y])
-    blue_red_ratio[mask] = np.divide(blue_band[mask], red_band[mask])
+    np.divide(blue_band, red_band, out=blue_red_ratio, where=mask)
 
     return blue_red_ratio
+
+
+def ratios(blue_band, red_band, out=None):
+    """Calculate the red/blue, blue/red and normalized blue/red ratios from the blue and red bands
+
+    Pixels where the blue or red band is zero (mask) are 0 in the red/blue and blue/red ratios and
+    settings.mask_value in the normalized blue/red ratio.
+
+    Args:
+        blue_band: blue band (float32)
+        red_band: red band (float32)
+        out (tuple): three preallocated float32 arrays for the ratios, see :meth:`buffers.get`
+
+    Returns:
+        tuple: red/blue ratio, blue/red ratio and normalized blue/red ratio (float32)
+    """
+    # rule out zeros
+    mask = np.logical_and(blue_band > 0, red_band > 0)
+
+    if out is None:
+        out = tuple(np.empty(mask.shape, dtype=np.float32) for i in range(3))
+    red_blue_ratio, blue_red_ratio, blue_red_ratio_norm = out
+
+    red_blue_ratio.fill(0)
+    blue_red_ratio.fill(0)
+    blue_red_ratio_norm.fill(settings.mask_value)
+
+    np.divide(red_band, blue_band, out=red_blue_ratio, where=mask)
+    np.divide(blue_band, red_band, out=blue_red_ratio, where=mask)
+
+    # normalized B/R ratio (B/R - 1) / (B/R + 1) = (B - R) / (B + R)
+    np.divide(blue_band - red_band, blue_band + red_band, out=blue_red_ratio_norm, where=mask)
+
+    return red_blue_ratio, blue_red_ratio, blue_red_ratio_norm
+
+
+def tables():
+    """Get the lookup tables of the ratios for every possible (B, R) pair of an 8-bit image
+
+    The tables are built on the first call. Each table has shape (256, 256) and is indexed as table[B, R].
+
+    Returns:
+        tuple: red/blue, blue/red and normalized blue/red ratio tables (float32)
+    """
+    global _tables
+
+    if _tables is None:
+        levels = np.arange(settings.max_color_value, dtype=np.float32)
+        blue_band, red_band = np.meshgrid(levels, levels, indexing='ij')
+        _tables = ratios(blue_band, red_band)
+
+    return _tables
+
+
+def fixed_classes_table(fixed_sunny_threshold, fixed_thin_threshold):
+    """Get the lookup table of the fixed threshold classes for every possible (B, R) pair of an 8-bit image
+
+    The classes (settings.class_mask, class_clear, class_thin and class_opaque) follow the decisions of
+    :meth:`classmap.fixed`. The table is rebuilt when the thresholds change.
+
+    Args:
+        fixed_sunny_threshold (float): clear sky/cloudy fixed threshold
+        fixed_thin_threshold (float): thin/opaque fixed threshold
+
+    Returns:
+        uint8 table of shape (256, 256), indexed as table[B, R]
+    """
+    global _classes_table, _classes_thresholds
+
+    if _classes_thresholds != (fixed_sunny_threshold, fixed_thin_threshold):
+        _classes_table = classmap.fixed(tables()[0], fixed_sunny_threshold, fixed_thin_threshold)
+        _classes_thresholds = (fixed_sunny_threshold, fixed_thin_threshold)
+
+    return _classes_table
+
+
+def table_index(img, out=None):
+    """Flat index B * 256 + R of every pixel in the lookup tables
+
+    Args:
+        img: 8-bit input image, or 8-bit sky pixels of shape (n, 3), see :meth:`sky_pixels.colors`
+        out: preallocated intp array for the index, see :meth:`buffers.get`
+
+    Returns:
+        index per image pixel
+    """
+    index = np.multiply(img[..., 0], settings.max_color_value, out=out, dtype=np.intp)
+    index += img[..., 2]
+
+    return index
+
+
+def fixed_classes(img, fixed_sunny_threshold, fixed_thin_threshold, out=None):
+    """Classify every pixel (mask, clear, thin or opaque) by a lookup of its (B, R) pair
+
+    Args:
+        img: 8-bit input image (masked), or 8-bit sky pixels of shape (n, 3), see :meth:`sky_pixels.colors`
+        fixed_sunny_threshold (float): clear sky/cloudy fixed threshold
+        fixed_thin_threshold (float): thin/opaque fixed threshold
+        out: preallocated uint8 array for the classes, see :meth:`buffers.get`
+
+    Returns:
+        uint8 class per image pixel
+    """
+    index = table_index(img, buffers.get(img.shape[:-1], np.intp))
+
+    return fixed_classes_table(fixed_sunny_threshold, fixed_thin_threshold).take(index, out=out, mode='clip')
+
+
+def compute(img, out=None):
+    """Calculate the red/blue, blue/red and normalized blue/red ratios per image pixel in one pass
+
+    The ratios are computed once per frame and shared by all consumers (thresholds, sky cover, overlays and labelled
+    image). Pixels where the blue or red band is zero (mask) are 0 in the red/blue and blue/red ratios and
+    settings.mask_value in the normalized blue/red ratio.
+
+    For 8-bit images and settings.use_lookup_tables, the ratios are gathered from the lookup tables (see
+    :meth:`ratio.tables`) in stead of calculated.
+
+    Args:
+        img: input image (masked), or sky pixels of shape (n, 3), see :meth:`sky_pixels.colors`
+        out (tuple): three preallocated float32 arrays for the ratios, see :meth:`buffers.get`
+
+    Returns:
+        tuple: red/blue ratio, blue/red ratio and normalized blue/red ratio (float32)
+    """
+    if out is None:
+        out = (None, None, None)
+
+    if settings.use_lookup_tables and img.dtype == np.uint8:
+        index = table_index(img, buffers.get(img.shape[:-1], np.intp))
+        return tuple(table.take(index, out=ratio_out, mode='clip') for table, ratio_out in zip(tables(), out))
+
+    blue_band = buffers.get(img.shape[:-1], np.float32)
+    red_band = buffers.get(img.shape[:-1], np.float32)
+    np.copyto(blue_band, img[..., 0])
+    np.copyto(red_band, img[..., 2])
+
+    return ratios(blue_band, red_band, None if out[0] is None else out)
@@ -1,4 +1,84 @@
 # TODO: convert the old docstring style to Google docstring style (is now set by default in PyCharm)
+import settings
+from collections import namedtuple
+import gzip
+import io
+import os
+import tarfile
+
+# keys of the properties file which are used and the corresponding fields of the record
+keys = {b'tsi.image.solar.altitude': 'altitude',
+        b'tsi.image.solar.azimuth': 'azimuth',
+        b'tsi.image.fraction.thin': 'thin_sky_cover_tsi',
+        b'tsi.image.fraction.opaque': 'opaque_sky_cover_tsi'}
+
+
+class Properties(namedtuple('Properties', ['altitude', 'azimuth', 'thin_sky_cover_tsi', 'opaque_sky_cover_tsi'])):
+    """Values of a TSI properties file, see :meth:`read_properties_file.parse`"""
+    __slots__ = ()
+
+    def fractional_sky_cover_tsi(self):
+        """Get the fractional sky cover of the 'old' TSI software
+
+        Returns:
+            tuple: thin, opaque and total fractional sky cover
+        """
+        return self.thin_sky_cover_tsi, self.opaque_sky_cover_tsi, self.opaque_sky_cover_tsi + self.thin_sky_cover_tsi
+
+
+def parse(data, name='properties file'):
+    """Decompress and parse a gzipped TSI properties file in a single pass
+
+    The file is read line by line until all keys are found, the rest of the file is not decompressed.
+
+    Args:
+        data (bytes): gzipped properties file
+        name (str): name of the file, used in the error message
+
+    Returns:
+        Properties: altitude, azimuth and fractional sky cover (thin/opaque) of the TSI software
+    """
+    values = {}
+
+    with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+        for line in f:
+            key, separator, value = line.partition(b'=')
+            field = keys.get(key)
+
+            if field is not None:
+                values[field] = float(value)
+
+                if len(values) == len(keys):
+                    break
+
+    if len(values) < len(keys):
+        missing = [key.decode() for key, field in keys.items() if field not in values]
+        raise Exception('Keys not found in ' + name + ': ' + ', '.join(missing))
+
+    return Properties(**values)
+
+
+def parse_archive(path):
+    """Parse all properties files of a daily TSI tar archive in one sequential read
+
+    Args:
+        path (str): location of the tar archive
+
+    Returns:
+        dict: :class:`read_properties_file.Properties` per filename without extension
+    """
+    properties = {}
+
+    with tarfile.open(path, 'r|') as tar:
+        for member in tar:
+            name = os.path.basename(member.name)
+
+            if member.isfile() and name.endswith(settings.properties_extension):
+                filename_no_ext = name[:-len(settings.properties_extension)]
+                properties[filename_no_ext] = parse(tar.extractfile(member).read(), name)
+
+    return properties
+
 
 def get_altitude(lines):
     """
@@ -35,6 +35,14 @@ main_data = project_folder + 'data/TSI/DBASE/201606/20160601_tsi-cabauw_realtime
 
 # external data sources
 tsi_database = '/net/baltink/nobackup/users/baltink/DATABASE/TSI/'
+# daily TSI archives, e.g. 20160601_tsi-cabauw_realtime.tar
+tar_extension = '_tsi-cabauw_realtime.tar'
+
+# catalog of all frames in tsi_database (see catalog.py)
+catalog_database = project_folder + 'data/TSI/catalog.sqlite'
+# period of the frames selected from the catalog, start inclusive and end exclusive (yyyy-mm-dd hh:mm:ss)
+catalog_start = '2016-06-01'
+catalog_end = '2016-07-01'
 
 # temporary folder(s)
 tmp = 'tmp/'
@@ -67,8 +75,20 @@ if data_type == cat_str:
 output_folder = files_folders.set_output_folder()
 
 # output
-output_data = project_folder + 'cloud_detection/cloudDetection/output_data/data.csv'
-output_data_copy = project_folder + 'cloud_detection/cloudDetection/output_data/data' + data_type + '.csv'
+# format of the output data: 'csv' or 'feather' (typed columns, see columnar.py)
+output_format = 'csv'
+# rows per record batch of the feather output
+batch_size = 256
+# rows per batch written by the background writer thread
+write_batch_size = 64
+# minimum time (seconds) between two progress updates of the processing loop
+progress_interval = 0.25
+output_data = project_folder + 'cloud_detection/cloudDetection/output_data/data.' + output_format
+output_data_copy = project_folder + 'cloud_detection/cloudDetection/output_data/data' + data_type + '.' + output_format
+# filenames of the frames that are written to output_data, used to resume an interrupted run
+output_manifest = project_folder + 'cloud_detection/cloudDetection/output_data/data.manifest'
+# sun circle/horizon area corrections
+corrections_data = project_folder + 'cloud_detection/cloudDetection/output_data/corrections.csv'
 
 # csv delimiter
 delimiter = ','
@@ -102,6 +122,14 @@ minute = '00'
 # that means: 'skip_loops = 120' results in 1 image every half an hour being processed as 4*30=120
 skip_loops = 40
 
+# parallel processing
+# number of worker processes used in the TSI processing loop, 1 results in the serial loop
+n_processes = 1
+# number of frames sent to a worker process at once
+chunk_size = 4
+# print the amount of buffers allocated per frame, none are allocated after the first frames (see buffers.py)
+report_allocations = 0
+
 # aerosol correction
 initial_adjustment_factor_limit = 0.5
 st_dev_limit = 0.09
@@ -111,6 +139,8 @@ horizon_sky_cover_limit = 0.2
 remainder_limit = 0.2
 st_dev_width = 11
 smoothing_width = 5
+# correct every observation day separately (in parallel if n_processes > 1), the windows never cross two days
+correct_per_day = True
 
 # resolutions of the system are set using get_resolution, initialize with None
 x = None
@@ -130,8 +160,21 @@ black = (0, 0, 0)
 
 # mask
 mask_value = -99
+# the masks of the most recent azimuths are cached, the azimuth is rounded to this step (degrees), 0: no rounding and no
+# caching. The band of the rounded azimuth differs from the exact one by up to about 300 (7 on average) of the ~44000
+# sky pixels of a frame
+mask_azimuth_step = 0.1
+
+# pixel classes
+class_mask = 0
+class_clear = 1
+class_thin = 2
+class_opaque = 3
+n_classes = 4
 
 # regions
+# region labels 0: mask, 1: outside, 2: horizon area, 3: inner circle, 4: sun circle
+n_regions = 5
 radius_sun_circle = 40
 radius_inner_circle = 80
 radius_circle = 125
@@ -141,6 +184,8 @@ band_thickness = 35
 width_horizon_area_degrees = 50
 r_inner = 40
 r_outer = 140
+# if True: get the region labels from the polar coordinates of the pixels in stead of the drawn RGB regions
+use_polar_regions = True
 radius_mobotix_circle = 850
 
 # sun position
@@ -159,6 +204,9 @@ fixed_thin_threshold = 0.9  # working: 0.9
 # swim #####################
 fixed_threshold_swim = 0.64
 
+use_lookup_tables = True  # if True: look up the ratios and fixed threshold classes of 8-bit images in 256x256 tables
+use_sky_pixels = True  # if True: compute the per-pixel statistics on the gathered sky pixels only (see sky_pixels.py)
+use_joint_histogram = False  # if True: derive sky covers, thresholds and pixel counts from the (B, R) histogram
 use_single_threshold = True  # if True: fixed thin/opaque threshold == fixed thin/clear sky threshold
 use_hybrid_SEG = False  # if True: use hybrid thresholding for SEG database (not recommended)
 
@@ -180,7 +228,11 @@ use_kmeans = True
 
 # core functionality
 use_processing_loop = 1
+resume_processing_loop = 0  # if True: append to output_data and skip the frames in output_manifest (TSI only)
+use_tar_archive = 0  # if True: read the frames directly from the daily tar archives found in main_data
+use_catalog = 0  # if True: select the frames from the catalog of tsi_database in stead of walking main_data
 use_postprocessing = 0
+use_online_correction = 0  # if True: write the corrections while processing TSI frames (needs use_postprocessing)
 use_statistical_analysis = 0
 use_machine_learning = 0
 crop_mobotix_images = 0
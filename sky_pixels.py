@@ -0,0 +1,66 @@
+"""Compact representation of the sky pixels of a frame.
+
+About half of a TSI frame is masked (outside the mirror, shadow band, camera and camera arm). The sky pixels are
+gathered once per frame into contiguous vectors using the cached flat index of the mask (see :meth:`mask.sky_index`),
+so the per-pixel statistics run on the sky pixels only and do not need to filter the masked pixels again. The results
+are scattered back to the full image only when an image is needed, e.g. for the overlays.
+"""
+import numpy as np
+
+
+def gather(data, index, out=None):
+    """Gather the sky pixels of an image or label map
+
+    Args:
+        data: image of shape (rows, columns, colors) or array of shape (rows, columns), e.g. the region labels
+        index: flat index of the sky pixels, see :meth:`mask.sky_index`
+        out: preallocated array of shape (n, colors) or (n,), see :meth:`buffers.get`
+
+    Returns:
+        contiguous array of shape (n, colors) or (n,)
+    """
+    # the index is always valid, mode='clip' avoids an internal copy when writing to out
+    return data.reshape((-1,) + data.shape[2:]).take(index, axis=0, out=out, mode='clip')
+
+
+def colors(img, index, out=None):
+    """Gather the colors of the sky pixels of an 8-bit image
+
+    A band which is zero is raised to 1, so that every sky pixel has a ratio (see :meth:`ratio.compute`) and a black
+    sky pixel is not mistaken for a masked pixel.
+
+    Args:
+        img: 8-bit image (not masked)
+        index: flat index of the sky pixels, see :meth:`mask.sky_index`
+        out: preallocated uint8 array of shape (n, colors), see :meth:`buffers.get`
+
+    Returns:
+        uint8 array of shape (n, colors) in BGR order
+    """
+    pixels = gather(img, index, out)
+    np.maximum(pixels, 1, out=pixels)
+
+    return pixels
+
+
+def scatter(values, index, shape, fill=0, out=None):
+    """Scatter the values of the sky pixels back to a full image
+
+    Args:
+        values: value per sky pixel
+        index: flat index of the sky pixels, see :meth:`mask.sky_index`
+        shape (tuple): resolution (rows, columns) of the image
+        fill: value of the masked pixels
+        out: preallocated array of shape (rows, columns), see :meth:`buffers.get`
+
+    Returns:
+        array of shape (rows, columns) with the dtype of values
+    """
+    if out is None:
+        out = np.empty(shape, dtype=values.dtype)
+
+    data = out.reshape(-1)
+    data.fill(fill)
+    data[index] = values
+
+    return out
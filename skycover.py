@@ -1,6 +1,10 @@
 import settings
 import numpy as np
 import math
+import ratio
+import labelled_image
+import classmap
+import buffers
 
 
 def fixed(red_blue_ratio, fixed_sunny_threshold, fixed_thin_threshold):
@@ -14,13 +18,48 @@ def fixed(red_blue_ratio, fixed_sunny_threshold, fixed_thin_threshold):
     Returns:
         tuple: thin sky cover, opaque sky cover and fractional sky cover
     """
-    # TODO: replace red_blue ratio with masked numpy version to clean up code below this comment, similar to hybrid below
-    # calculate number of sunny/thin and opaque pixels
-    clear_sky = np.sum(np.logical_and(red_blue_ratio > 0.01, red_blue_ratio <= fixed_sunny_threshold))
-    thin = np.sum(np.logical_and(red_blue_ratio > 0.01,
-                                        np.logical_and(red_blue_ratio > fixed_sunny_threshold,
-                                                       red_blue_ratio <= fixed_thin_threshold)))
-    opaque = np.sum(np.logical_and(red_blue_ratio > 0.01, red_blue_ratio > fixed_thin_threshold))
+    # check for NaN values
+    if math.isnan(np.min(red_blue_ratio)):
+        raise Exception('R/B ratio NaN found')
+
+    classes = classmap.fixed(red_blue_ratio, fixed_sunny_threshold, fixed_thin_threshold)
+
+    return fixed_table(labelled_image.contingency_table(None, classes))
+
+
+def fixed_lookup(img, fixed_sunny_threshold, fixed_thin_threshold):
+    """Calculate the fractional sky cover based on fixed thresholding, using the lookup table of pixel classes.
+
+    Gives the same result as :meth:`skycover.fixed`, see :meth:`ratio.fixed_classes`.
+
+    Args:
+        img: 8-bit masked image
+        fixed_sunny_threshold (float): clear sky/cloudy fixed threshold
+        fixed_thin_threshold (float): thin/opaque fixed threshold
+
+    Returns:
+        tuple: thin sky cover, opaque sky cover and fractional sky cover
+    """
+    classes = ratio.fixed_classes(img, fixed_sunny_threshold, fixed_thin_threshold)
+
+    return fixed_table(labelled_image.contingency_table(None, classes))
+
+
+def fixed_table(table):
+    """Calculate the fractional sky cover from the amount of pixels per region and fixed threshold class
+
+    Args:
+        table: amount of pixels per region label and class, see :meth:`labelled_image.contingency_table`
+
+    Returns:
+        tuple: thin sky cover, opaque sky cover and fractional sky cover
+    """
+    counts = table.sum(axis=0)
+
+    # number of sunny/thin and opaque pixels
+    clear_sky = counts[settings.class_clear]
+    thin = counts[settings.class_thin]
+    opaque = counts[settings.class_opaque]
 
     cloud = thin + opaque
 
@@ -28,13 +67,6 @@ def fixed(red_blue_ratio, fixed_sunny_threshold, fixed_thin_threshold):
     cloud_cover_opaque = opaque / (clear_sky + cloud)
     cloud_cover_total = cloud_cover_thin + cloud_cover_opaque
 
-    # check for NaN and odd values
-    if math.isnan(np.min(red_blue_ratio)):
-        raise Exception('R/B ratio NaN found')
-
-    if clear_sky + cloud > settings.y * settings.x:
-        raise Exception('Total amount of non-mask pixels error: ', clear_sky, cloud)
-
     return cloud_cover_thin, cloud_cover_opaque, cloud_cover_total
 
 
@@ -49,8 +81,9 @@ def hybrid(ratioBR_norm_1d_nz, hybrid_threshold):
         float: fractional sky cover as determined by the hybrid thresholding algorithm
     """
 
-    clear_sky = np.sum(ratioBR_norm_1d_nz > hybrid_threshold)
-    cloud = np.sum(ratioBR_norm_1d_nz < hybrid_threshold)
+    condition = buffers.get(ratioBR_norm_1d_nz.shape, np.bool_)
+    clear_sky = np.count_nonzero(np.greater(ratioBR_norm_1d_nz, hybrid_threshold, out=condition))
+    cloud = np.count_nonzero(np.less(ratioBR_norm_1d_nz, hybrid_threshold, out=condition))
 
     cloud_cover_total = cloud / (clear_sky + cloud)
 
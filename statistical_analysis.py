@@ -1,72 +1,159 @@
 import numpy as np
 import settings
-from math import log10, sqrt
-from skimage.feature import greycomatrix
+from math import sqrt
 import color_bands
 import resolution
 
 
-# TODO: mask GLCM matrices properly with NumPy
+# weight matrices of the textural features, cached per number of grey levels
+_feature_weights = {}
+
 # TODO: color_bands.extract and scaler calc is called two times separately in fucntions, can i avoid this?
 
-def calculate_greymatrix(img):
-    """Calculate the Grey Level Co-occurence Matrix (GLCM)
+
+def co_occurrence(grey, valid, offset, grey_levels):
+    """Count the co-occurring grey levels of all valid pixel pairs at a given offset
+
+    Every pair (i, j) is encoded as the index :math:`i \\cdot levels + j` and counted with np.bincount.
 
     Args:
-        img: masked RGB image (NumPy array)
+        grey: grey levels per pixel (integers smaller than grey_levels)
+        valid: boolean array, True for pixels that are not masked
+        offset (tuple): (row, column) offset of the neighbouring pixel
+        grey_levels (int): number of grey levels
 
     Returns:
-        grey level co-occurrence matrix
+        grey level co-occurrence counts of shape (grey_levels, grey_levels)
+    """
+    dy, dx = offset
+    rows, columns = grey.shape
+
+    # slices of the reference pixels and their neighbours
+    reference = (slice(max(0, -dy), rows - max(0, dy)), slice(max(0, -dx), columns - max(0, dx)))
+    neighbour = (slice(max(0, dy), rows - max(0, -dy)), slice(max(0, dx), columns - max(0, -dx)))
+
+    # only pairs of which both pixels are not masked
+    pairs = np.logical_and(valid[reference], valid[neighbour])
+    index = grey[reference][pairs] * grey_levels + grey[neighbour][pairs]
+
+    counts = np.bincount(index, minlength=grey_levels * grey_levels)
+
+    return counts.reshape(grey_levels, grey_levels)
+
+
+def calculate_greymatrix(img, mask_array=None, normed=False):
+    """Calculate the Grey Level Co-occurence Matrix (GLCM) of the blue band
+
+    Pairs of horizontally neighbouring pixels (distance settings.dx, angle 0) are used. Pixels outside the mask are
+    excluded from the matrix. By default the matrix holds the counts of the pairs, like skimage's greycomatrix. The
+    textural features (:meth:`statistical_analysis.textural_features`) use the counts, so they have the same scale as
+    in the existing output data and the models trained on it.
+
+    Args:
+        img: RGB image (NumPy array)
+        mask_array: boolean or uint8 mask, nonzero for the pixels to be used (all pixels if None)
+        normed (bool): divide the counts by the number of valid pairs, so the matrix sums to 1 (all zeros if there
+            are no valid pairs)
+
+    Returns:
+        grey level co-occurrence matrix (counts, or fractions if normed)
     """
     # set the number of grey levels used in the GLCM calculation
     scaler = int(settings.max_color_value / settings.grey_levels)
 
-    # extract the individual color bands as greyscale
-    blue_band, green_band, red_band = color_bands.extract(scaler, img)
+    # grey levels of the blue band, the image itself is not changed
+    blue_band = img[:, :, 0].astype(np.intp) // scaler
 
-    blue_band = blue_band.astype(int)
-    # Grey Level Co-occurrence Matrices (GLCM)
+    if mask_array is None:
+        valid = np.ones(blue_band.shape, dtype=bool)
+    else:
+        if mask_array.ndim == 3:
+            mask_array = mask_array[:, :, 0]
+        valid = mask_array > 0
 
-    GLCM = greycomatrix(blue_band, [settings.dx, settings.dy],
-                        [0, np.pi / 2, np.pi, 3 * np.pi / 2], levels=settings.grey_levels)
+    # Grey Level Co-occurrence Matrix (GLCM)
+    GLCM = co_occurrence(blue_band, valid, (0, settings.dx), settings.grey_levels)
 
-    # convert 4D array to 2D array
-    GLCM2D = GLCM[:, :, 0, 0]
+    if not normed:
+        return GLCM
 
-    return GLCM2D
+    # normalize, a fully masked image has no valid pairs
+    n_pairs = np.sum(GLCM)
+    if n_pairs == 0:
+        return np.zeros(GLCM.shape)
 
+    return GLCM / n_pairs
 
-def textural_features(img):
-    """Determine statistical features from grey level co-occurrence matrix
+
+def feature_weights(grey_levels):
+    """Get the weight matrices :math:`(i-j)^2` and :math:`1/(1+|i-j|)` used for the contrast and homogeneity
+
+    The matrices are cached per number of grey levels.
 
     Args:
-         img (int): masked RGB image (NumPy array)
+        grey_levels (int): number of grey levels of the GLCM
 
     Returns:
-        tuple: energy, entropy, contrast, homogeneity
+        tuple: contrast weights, homogeneity weights
     """
+    if grey_levels not in _feature_weights:
+        i, j = np.indices((grey_levels, grey_levels))
+        _feature_weights[grey_levels] = (np.square(i - j), 1 / (1 + np.abs(i - j)))
+
+    return _feature_weights[grey_levels]
 
-    GLCM = calculate_greymatrix(img)
 
-    energy = entropy = contrast = homogeneity = 0
+def glcm_features(GLCM):
+    """Determine statistical features from one or more grey level co-occurrence matrices
+
+    Args:
+        GLCM: grey level co-occurrence matrix of shape (grey_levels, grey_levels), or a batch of matrices of shape
+            (n, grey_levels, grey_levels)
 
-    for i in range(0, settings.grey_levels):
-        for j in range(0, settings.grey_levels):
-            if GLCM[i, j] != 0:
-                # Energy (B)
-                energy += np.power(GLCM[i, j], 2)
-                # Entropy (B)
-                entropy += GLCM[i, j] * log10(GLCM[i, j])
-                # Contrast (B)
-                contrast += GLCM[i, j] * (i - j) ** 2
-                # Homogeneity (B)
-                homogeneity += GLCM[i, j] / (1 + abs(i - j))
-            else:
-                pass
+    Returns:
+        tuple: energy, entropy, contrast, homogeneity (scalars, or arrays of length n for a batch)
+    """
+    GLCM = np.asarray(GLCM)
+    if np.issubdtype(GLCM.dtype, np.integer):
+        # GLCM with counts, avoid overflow
+        GLCM = GLCM.astype(np.int64)
+
+    contrast_weights, homogeneity_weights = feature_weights(GLCM.shape[-1])
+    axes = (-2, -1)
+
+    # Energy (B)
+    energy = np.sum(np.square(GLCM), axis=axes)
+    # Entropy (B), only the nonzero elements contribute
+    log_GLCM = np.zeros(GLCM.shape)
+    np.log10(GLCM, out=log_GLCM, where=GLCM != 0)
+    entropy = np.sum(GLCM * log_GLCM, axis=axes)
+    # Contrast (B)
+    contrast = np.sum(GLCM * contrast_weights, axis=axes)
+    # Homogeneity (B)
+    homogeneity = np.sum(GLCM * homogeneity_weights, axis=axes)
 
     return energy, entropy, contrast, homogeneity
 
 
+def textural_features(img, mask_array=None):
+    """Determine statistical features from grey level co-occurrence matrix
+
+    The features are calculated from the GLCM with counts (not normed), see
+    :meth:`statistical_analysis.calculate_greymatrix`.
+
+    Args:
+         img (int): RGB image (NumPy array)
+         mask_array: mask of the pixels to be used, see :meth:`statistical_analysis.calculate_greymatrix`
+
+    Returns:
+        tuple: energy, entropy, contrast, homogeneity
+    """
+
+    GLCM = calculate_greymatrix(img, mask_array)
+
+    return glcm_features(GLCM)
+
+
 def spectral_features(img):
     """Calculate spectral features from image
 
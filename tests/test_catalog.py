@@ -0,0 +1,32 @@
+import sqlite3
+import catalog
+
+
+def connect(filenames):
+    """In-memory catalog with frames of the given filenames"""
+    connection = sqlite3.connect(':memory:')
+    connection.row_factory = sqlite3.Row
+    connection.executescript(catalog.schema)
+    connection.executemany('INSERT INTO frames (filename, timestamp) VALUES (?, ?)',
+                           [(filename, catalog.timestamp(filename)) for filename in filenames])
+
+    return connection
+
+
+def test_nearest_across_minute():
+    connection = connect(['20160601115950', '20160601120030'])
+
+    # 10 s before and 30 s after the requested time
+    assert catalog.nearest(connection, '20160601120000')['filename'] == '20160601115950'
+
+
+def test_nearest_across_day():
+    connection = connect(['20160531235955', '20160601000020'])
+
+    assert catalog.nearest(connection, '20160601000000')['filename'] == '20160531235955'
+
+
+def test_nearest_exact_and_empty():
+    assert catalog.nearest(connect(['20160601120000', '20160601120030']), '20160601120000')['filename'] == \
+        '20160601120000'
+    assert catalog.nearest(connect([]), '20160601120000') is None
@@ -0,0 +1,57 @@
+from contextlib import nullcontext
+import numpy as np
+import pytest
+import settings
+import buffers
+import mask
+import classmap
+import createregions
+import labelled_image
+
+
+@pytest.fixture
+def frame(monkeypatch):
+    """Random TSI-sized image with its mask and fixed threshold classes"""
+    monkeypatch.setattr(settings, 'y', 352)
+    monkeypatch.setattr(settings, 'x', 288)
+    monkeypatch.setattr(settings, 'n_colors', 3)
+
+    img = np.random.default_rng(0).integers(1, 256, (settings.y, settings.x, settings.n_colors), dtype=np.uint8)
+    mask_array = mask.create(img, 150.)
+    red_blue_ratio = img[..., 2] / img[..., 0] * mask_array
+    classes = classmap.fixed(red_blue_ratio, settings.fixed_sunny_threshold, settings.fixed_thin_threshold)
+
+    return img, mask_array, classes
+
+
+def expected_table(labels, classes):
+    """Count the pixels per region label and class one combination at a time"""
+    table = np.zeros((settings.n_regions, settings.n_classes), dtype=np.intp)
+    for label in range(settings.n_regions):
+        for pixel_class in range(settings.n_classes):
+            table[label, pixel_class] = np.count_nonzero((labels == label) & (classes == pixel_class))
+
+    return table
+
+
+@pytest.mark.parametrize('use_polar_regions', [True, False])
+@pytest.mark.parametrize('pooled', [True, False])
+def test_contingency_table(frame, monkeypatch, use_polar_regions, pooled):
+    img, mask_array, classes = frame
+    monkeypatch.setattr(settings, 'use_polar_regions', use_polar_regions)
+
+    with buffers.frame() if pooled else nullcontext():
+        labels = createregions.create(img, 150., 40., mask_array)[2]
+        table = labelled_image.contingency_table(labels, classes)
+
+    # the labels of the regions drawn with OpenCV are float
+    assert labels.dtype == (np.uint8 if use_polar_regions else np.float64)
+    np.testing.assert_array_equal(table, expected_table(labels, classes))
+
+
+def test_contingency_table_single_region(frame):
+    img, mask_array, classes = frame
+
+    table = labelled_image.contingency_table(None, classes)
+
+    np.testing.assert_array_equal(table, [np.bincount(classes.ravel(), minlength=settings.n_classes)])
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import settings
+import statistical_analysis
+
+
+@pytest.fixture
+def img():
+    return np.random.default_rng(0).integers(0, 256, (64, 48, 3), dtype=np.uint8)
+
+
+def grey_levels(img):
+    return img[:, :, 0] // int(settings.max_color_value / settings.grey_levels)
+
+
+def test_greymatrix_counts(img):
+    skimage_feature = pytest.importorskip('skimage.feature')
+
+    expected = skimage_feature.graycomatrix(grey_levels(img), [settings.dx], [0], levels=settings.grey_levels)
+
+    np.testing.assert_array_equal(statistical_analysis.calculate_greymatrix(img), expected[:, :, 0, 0])
+
+
+def test_greymatrix_normed(img):
+    counts = statistical_analysis.calculate_greymatrix(img)
+    normed = statistical_analysis.calculate_greymatrix(img, normed=True)
+
+    assert normed.sum() == pytest.approx(1)
+    np.testing.assert_allclose(normed, counts / counts.sum())
+
+
+def test_greymatrix_masked(img):
+    mask_array = np.zeros(img.shape[:2], dtype=bool)
+    mask_array[:, :24] = True
+
+    counts = statistical_analysis.calculate_greymatrix(img, mask_array)
+    normed = statistical_analysis.calculate_greymatrix(img, mask_array, normed=True)
+
+    # only the pairs of which both pixels are in the left half
+    assert counts.sum() == 64 * (24 - settings.dx)
+    np.testing.assert_allclose(normed, counts / counts.sum())
+
+
+def test_greymatrix_fully_masked(img):
+    mask_array = np.zeros(img.shape[:2], dtype=bool)
+
+    assert statistical_analysis.calculate_greymatrix(img, mask_array).sum() == 0
+    np.testing.assert_array_equal(statistical_analysis.calculate_greymatrix(img, mask_array, normed=True), 0)
@@ -1,7 +1,6 @@
 import numpy as np
 import settings
-from math import log10
-import ratio
+import buffers
 
 
 def fixed():
@@ -20,49 +19,70 @@ def fixed():
         return fixed_sunny_threshold, fixed_thin_threshold
 
 
-def min_cross_entropy(data, nbins):
-    """Minimum cross entropy algorithm to determine the minimum of a histogram
+def min_cross_entropy_hist(hist, bins):
+    """Minimum cross entropy algorithm to determine the minimum of one or more histograms
+
+    All candidate thresholds are scored at once using the cumulative sums of :math:`h_i` and :math:`i h_i`. A 2D
+    array of histograms (one histogram per row) is thresholded in a single call.
 
     Args:
-        data (float): the image data (e.g. blue/red ratio) to be used in the histogram
-        nbins (int): number of histogram bins
+        hist: histogram counts, shape (L,) or (n, L)
+        bins: histogram bin edges, shape (L + 1,) or (n, L + 1)
 
     Returns:
-        float: the MCE threshold
+        float: the MCE threshold, or an array of n thresholds
     """
-    # create the histogram and determine length
-    hist, bins = np.histogram(data, nbins)
-    L = len(hist)
+    batch = np.ndim(hist) == 2
 
-    thresholdList = []
+    hist = np.array(hist, dtype=float, ndmin=2)
+    bins = np.array(bins, ndmin=2)
+    L = hist.shape[-1]
 
     # catch zeros which cause error if not changed to one
-    if hist[1] == 0:
-        hist[1] = 1
-    if hist[L - 2] == 0:
-        hist[L - 2] = 1
-
-    for iThreshold in range(2, L):
-        m1 = 0
-        m2 = 0
-        mu1 = 0
-        mu2 = 0
+    hist[hist[:, 1] == 0, 1] = 1
+    hist[hist[:, L - 2] == 0, L - 2] = 1
 
-        for i in range(1, iThreshold):
-            m1 += i * hist[i]
-            mu1 += hist[i]
+    # the first bin is not used
+    hist[:, 0] = 0
+    i = np.arange(L)
 
-        for i in range(iThreshold, L):
-            m2 += i * hist[i]
-            mu2 += hist[i]
+    # cumulative sums up to (but not including) threshold t = 2, ..., L - 1
+    mu_cumulative = np.cumsum(hist, axis=-1)[:, 1:L - 1]
+    m_cumulative = np.cumsum(i * hist, axis=-1)[:, 1:L - 1]
+    mu_total = mu_cumulative[:, -1:] + hist[:, L - 1:]
+    m_total = m_cumulative[:, -1:] + (L - 1) * hist[:, L - 1:]
 
-        mu1 = m1 / mu1
-        mu2 = m2 / mu2
+    m1 = m_cumulative
+    m2 = m_total - m_cumulative
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mu1 = m1 / mu_cumulative
+        mu2 = m2 / (mu_total - mu_cumulative)
 
-        thresholdList.append(-m1 * log10(mu1) - m2 * log10(mu2))
+        threshold_list = -m1 * np.log10(mu1) - m2 * np.log10(mu2)
 
     # minimum of the list is the threshold
-    threshold = bins[np.argmin(thresholdList)]
+    threshold = np.take_along_axis(bins, np.argmin(threshold_list, axis=-1)[:, np.newaxis], axis=-1)[:, 0]
+
+    if batch:
+        return threshold
+    else:
+        return threshold[0]
+
+
+def min_cross_entropy(data, nbins):
+    """Minimum cross entropy algorithm to determine the minimum of a histogram
+
+    Args:
+        data (float): the image data (e.g. blue/red ratio) to be used in the histogram
+        nbins (int): number of histogram bins
+
+    Returns:
+        float: the MCE threshold
+    """
+    # create the histogram
+    hist, bins = np.histogram(data, nbins)
+
+    threshold = min_cross_entropy_hist(hist, bins)
 
     # catch miscalculation
     if threshold <= 0:
@@ -78,48 +98,56 @@ def min_cross_entropy(data, nbins):
     return threshold
 
 
-def flatten_clean_array(img):
-    """Convert 2D masked image to 1D flattened array to be used in MCE algorithm
+def flatten_clean_array(blue_red_ratio_norm):
+    """Convert 2D masked normalized blue/red ratios to 1D flattened array to be used in MCE algorithm
 
     Args:
-        img: masked image
+        blue_red_ratio_norm: normalized blue/red ratio per pixel, see :meth:`ratio.compute`
 
     Returns:
-        tuple: 1D (only nonzeros) and 2D array of normalized blue/red ratios
+        tuple: 1D (only non-mask values) and 2D array of normalized blue/red ratios
     """
-    blue_red_ratio = ratio.blue_red(img)
-
-    # all values equal to zero black outsides + Cabauw tower
-    mask_inv = blue_red_ratio == 0
-
-    # normalized B/R ratio
-    blue_red_ratio_norm = np.divide(blue_red_ratio - 1, blue_red_ratio + 1)
-    blue_red_ratio_norm[mask_inv] = settings.mask_value
-
-    blue_red_ratio_1d = blue_red_ratio.flatten()
-    blue_red_ratio_1d_nz = blue_red_ratio_1d[blue_red_ratio_1d > 0]
-    blue_red_ratio_1d_nz_norm = np.divide(blue_red_ratio_1d_nz -1, blue_red_ratio_1d_nz + 1)
-
     # catch Nan
-    if np.argwhere(np.isnan(blue_red_ratio_norm)).any():
+    if np.isnan(blue_red_ratio_norm).any():
         raise Exception('NaN found in B/R ratios')
 
+    # all values equal to the mask value: black outsides + Cabauw tower
+    blue_red_ratio_1d_nz_norm = blue_red_ratio_norm[blue_red_ratio_norm != settings.mask_value]
+
     return blue_red_ratio_1d_nz_norm, blue_red_ratio_norm
 
 
-def hybrid(img):
+def hybrid(blue_red_ratio_norm):
     """Decide between fixed or MCE thresholding as part of hybrid thresholding algorithm
 
     Args:
-        img (int): masked image
+        blue_red_ratio_norm: normalized blue/red ratio per pixel, see :meth:`ratio.compute`
 
     Returns:
         tuple: normalized 1D flattened masked red/blue ratio array, standard deviation of the image and hybrid threshold
     """
-    blue_red_ratio_norm_1d_nz, blue_red_ratio_norm_nz = flatten_clean_array(img)
+    blue_red_ratio_norm_1d_nz, blue_red_ratio_norm_nz = flatten_clean_array(blue_red_ratio_norm)
 
-    # calculate standard deviation
-    st_dev = np.std(blue_red_ratio_norm_1d_nz)
+    st_dev, threshold = hybrid_sky(blue_red_ratio_norm_1d_nz)
+
+    return blue_red_ratio_norm_1d_nz, blue_red_ratio_norm_nz, st_dev, threshold
+
+
+def hybrid_sky(blue_red_ratio_norm_1d_nz):
+    """Decide between fixed or MCE thresholding using the normalized blue/red ratios of the sky pixels only
+
+    Args:
+        blue_red_ratio_norm_1d_nz: normalized blue/red ratio of the sky pixels, see :meth:`sky_pixels.colors`
+
+    Returns:
+        tuple: standard deviation of the image and hybrid threshold
+    """
+    # calculate standard deviation, as np.std but with the deviations in a buffer of the pool
+    n = len(blue_red_ratio_norm_1d_nz)
+    mean = np.add.reduce(blue_red_ratio_norm_1d_nz, dtype=np.float64) / n
+    deviation = np.subtract(blue_red_ratio_norm_1d_nz, mean, out=buffers.get((n,), np.float64))
+    np.multiply(deviation, deviation, out=deviation)
+    st_dev = np.sqrt(np.add.reduce(deviation, dtype=np.float64) / n)
 
     # decide which thresholding needs to be used
     if st_dev <= settings.deviation_threshold:
@@ -129,4 +157,4 @@ def hybrid(img):
         # MCE thresholding
         threshold = min_cross_entropy(blue_red_ratio_norm_1d_nz, settings.nbins_hybrid)
 
-    return blue_red_ratio_norm_1d_nz, blue_red_ratio_norm_nz, st_dev, threshold
+    return st_dev, threshold
@@ -0,0 +1,216 @@
+"""Lazy, memoised products of a single TSI frame.
+
+A :class:`tsi_frame.Frame` reads and decodes the images and computes the derived products (mask, ratios, class maps,
+labels, sky covers, overlays, ...) on first access and keeps them. Every stage of the processing loop pulls only what
+it needs, so the products of features which are disabled in the settings are never computed.
+"""
+from functools import cached_property
+import numpy as np
+import settings
+import buffers
+import frame_source
+import resolution
+import mask
+import sky_pixels
+import ratio
+import classmap
+import thresholds
+import createregions
+import labelled_image
+import joint_histogram
+import skycover
+import overlay
+
+
+class Frame:
+    """Products of a single TSI frame, computed on first access
+
+    Args:
+        filename (str): filename without extension
+        properties: parsed properties file, see :meth:`read_properties_file.parse`
+        jpg: location of the jpg file, see :class:`frame_source.Member`
+        png: location of the png file of the old TSI software, None if there is no png
+    """
+
+    def __init__(self, filename, properties, jpg, png):
+        self.filename = filename
+        self.properties = properties
+        self.jpg = jpg
+        self.png = png
+
+        # get the altitude and azimuth from the properties file
+        self.altitude = properties.altitude
+        self.azimuth = properties.azimuth
+
+    def buffer(self, dtype, *channels):
+        """Get an array of the pool for the pixels of the statistics, see :meth:`buffers.get`
+
+        Args:
+            dtype: data type of the array
+            *channels: trailing axes, e.g. the amount of colors
+
+        Returns:
+            uninitialized array per sky pixel or per image pixel
+        """
+        if settings.use_sky_pixels:
+            return buffers.get((len(self.sky_index),) + channels, dtype)
+
+        return buffers.get((settings.y, settings.x) + channels, dtype)
+
+    @cached_property
+    def img(self):
+        """Decoded jpg image, the resolution of the system is set on decoding (see :meth:`resolution.get_resolution`)"""
+        img = frame_source.decode_image(frame_source.read(self.jpg))
+        resolution.get_resolution(img)
+
+        return img
+
+    @cached_property
+    def img_tsi(self):
+        """Decoded png image of the old TSI software, only read when it is used (e.g. by the plots)"""
+        return frame_source.decode_image(frame_source.read(self.png))
+
+    @cached_property
+    def mask_array(self):
+        """Boolean mask, see :meth:`mask.create`"""
+        return mask.create(self.img, self.azimuth)
+
+    @cached_property
+    def sky_index(self):
+        """Flat index of the sky pixels, see :meth:`mask.sky_index`"""
+        return mask.sky_index(self.img, self.azimuth)
+
+    @cached_property
+    def pixels(self):
+        """Pixels of the per-pixel statistics: the sky pixels (see :meth:`sky_pixels.colors`) or the masked image"""
+        if settings.use_sky_pixels:
+            return sky_pixels.colors(self.img, self.sky_index, out=self.buffer(np.uint8, settings.n_colors))
+
+        return mask.apply(self.img, self.mask_array, out=self.buffer(np.uint8, settings.n_colors))
+
+    @cached_property
+    def fixed_thresholds(self):
+        """Clear sky/cloudy and thin/opaque fixed thresholds, see :meth:`thresholds.fixed`"""
+        return thresholds.fixed()
+
+    @cached_property
+    def segments(self):
+        """Regions, outlines, labels, stencil and image with outlines, see :meth:`createregions.create`"""
+        return createregions.create(self.img, self.azimuth, self.altitude, self.mask_array)
+
+    @cached_property
+    def labels(self):
+        """Region label per image pixel, see :meth:`createregions.label_map`"""
+        if not settings.use_polar_regions:
+            return self.segments[2]
+
+        mask_array = self.mask_array
+
+        return createregions.label_map((settings.y, settings.x), self.azimuth, self.altitude, mask_array,
+                                       out=buffers.get((settings.y, settings.x), np.uint8))
+
+    @cached_property
+    def pixel_labels(self):
+        """Region label of the pixels of the statistics, None if the postprocessing is disabled"""
+        if not settings.use_postprocessing:
+            return None
+
+        if settings.use_sky_pixels:
+            return sky_pixels.gather(self.labels, self.sky_index, out=self.buffer(np.uint8))
+
+        return self.labels
+
+    @cached_property
+    def ratios(self):
+        """Red/blue, blue/red and normalized blue/red ratio of the pixels, see :meth:`ratio.compute`"""
+        return ratio.compute(self.pixels, out=tuple(self.buffer(np.float32) for i in range(3)))
+
+    @cached_property
+    def classes(self):
+        """Fixed threshold class of the pixels, see :meth:`classmap.fixed`"""
+        if settings.use_lookup_tables or settings.use_joint_histogram:
+            return ratio.fixed_classes(self.pixels, *self.fixed_thresholds, out=self.buffer(np.uint8))
+
+        return classmap.fixed(self.ratios[0], *self.fixed_thresholds, out=self.buffer(np.uint8))
+
+    @cached_property
+    def hist(self):
+        """Joint (B, R) histogram of the pixels, per region if the postprocessing is enabled"""
+        return joint_histogram.compute(self.pixels, self.pixel_labels)
+
+    @cached_property
+    def hist_total(self):
+        """Joint (B, R) histogram of all pixels"""
+        if self.pixel_labels is None:
+            return self.hist
+
+        return self.hist.sum(axis=0)
+
+    @cached_property
+    def table(self):
+        """Amount of pixels per region and fixed threshold class, see :meth:`labelled_image.contingency_table`"""
+        if settings.use_joint_histogram:
+            return joint_histogram.table(self.hist, *self.fixed_thresholds)
+
+        return labelled_image.contingency_table(self.pixel_labels, self.classes)
+
+    @cached_property
+    def fixed_cover(self):
+        """Thin, opaque and total fractional sky cover based on fixed thresholding"""
+        return skycover.fixed_table(self.table)
+
+    @cached_property
+    def sky_ratios(self):
+        """Normalized blue/red ratio of the sky pixels only (1D)"""
+        if settings.use_sky_pixels:
+            return self.ratios[2]
+
+        return thresholds.flatten_clean_array(self.ratios[2])[0]
+
+    @cached_property
+    def hybrid_threshold(self):
+        """Standard deviation of the normalized blue/red ratio and hybrid threshold"""
+        if settings.use_joint_histogram:
+            return joint_histogram.hybrid_threshold(self.hist_total)
+
+        return thresholds.hybrid_sky(self.sky_ratios)
+
+    @cached_property
+    def hybrid_cover(self):
+        """Fractional sky cover based on hybrid thresholding"""
+        if settings.use_joint_histogram:
+            return joint_histogram.hybrid(self.hist_total, self.hybrid_threshold[1])
+
+        return skycover.hybrid(self.sky_ratios, self.hybrid_threshold[1])
+
+    def class_image(self, classes):
+        """Get the class map of the full image from the classes of the pixels
+
+        Args:
+            classes: class of the pixels of the statistics
+
+        Returns:
+            uint8 class per image pixel
+        """
+        if settings.use_sky_pixels:
+            return sky_pixels.scatter(classes, self.sky_index, (settings.y, settings.x), settings.class_mask,
+                                      out=buffers.get((settings.y, settings.x), np.uint8))
+
+        return classes
+
+    @cached_property
+    def fixed_overlay(self):
+        """Fixed threshold classes with outlines, see :meth:`overlay.render`"""
+        regions, outlines, labels, stencil, image_with_outlines = self.segments
+
+        return overlay.render(self.class_image(self.classes), outlines, stencil,
+                              out=buffers.get((settings.y, settings.x, settings.n_colors), np.uint8))
+
+    @cached_property
+    def hybrid_overlay(self):
+        """Hybrid threshold classes with outlines, see :meth:`overlay.render`"""
+        regions, outlines, labels, stencil, image_with_outlines = self.segments
+        classes = classmap.hybrid(self.ratios[2], self.hybrid_threshold[1], out=self.buffer(np.uint8))
+
+        return overlay.render(self.class_image(classes), outlines, stencil,
+                              out=buffers.get((settings.y, settings.x, settings.n_colors), np.uint8))
@@ -1,4 +1,78 @@
 import settings
+import queue
+import threading
+
+
+# names and types (NumPy) of the columns of the output data per data type, in the order of the data rows
+schemas = {settings.tsi_str: [('filename', 'U64'),
+                              ('altitude', 'float64'),
+                              ('azimuth', 'float64'),
+                              ('thin_sky_cover', 'float32'),
+                              ('opaque_sky_cover', 'float32'),
+                              ('cloud_cover_fixed', 'float32'),
+                              ('cloud_cover_hybrid', 'float32'),
+                              ('thin_cloud_cover_TSI', 'float32'),
+                              ('opaque_cloud_cover_TSI', 'float32'),
+                              ('cloud_cover_TSI', 'float32'),
+                              ('energy', 'float32'),
+                              ('entropy', 'float32'),
+                              ('contrast', 'float32'),
+                              ('homogeneity', 'float32'),
+                              ('outside_c', 'int32'),
+                              ('outside_s', 'int32'),
+                              ('horizon_c', 'int32'),
+                              ('horizon_s', 'int32'),
+                              ('inner_c', 'int32'),
+                              ('inner_s', 'int32'),
+                              ('sun_c', 'int32'),
+                              ('sun_s', 'int32'),
+                              ],
+           settings.cat_str: [('filename', 'U64'),
+                              ('mean_r', 'float32'),
+                              ('mean_g', 'float32'),
+                              ('mean_b', 'float32'),
+                              ('st_dev', 'float32'),
+                              ('skewness', 'float32'),
+                              ('diff_rg', 'float32'),
+                              ('diff_rb', 'float32'),
+                              ('diff_gb', 'float32'),
+                              ('enegry', 'float32'),
+                              ('entropy', 'float32'),
+                              ('contrast', 'float32'),
+                              ('homogeneity', 'float32'),
+                              ('cloud_cover_fixed', 'float32'),
+                              ('cloud_cover_hybrid', 'float32'),
+                              ('cloud_type', 'int32')
+                              ],
+           settings.seg_str: [('filename', 'U64'),
+                              ('cloud_cover_GT', 'float32'),
+                              ('cloud_cover_fixed', 'float32'),
+                              ('cloud_cover_hybrid', 'float32'),
+                              ],
+           settings.mob_str: [('filename', 'U64'),
+                              ('azimuth', 'float64'),
+                              ('altitude', 'float64'),
+                              ('energy', 'float32'),
+                              ('entropy', 'float32'),
+                              ('contrast', 'float32'),
+                              ('homogeneity', 'float32'),
+                              ('cloud_cover', 'float32')
+                              ]}
+
+# columns which are derived from the filename when writing a columnar file, see :class:`columnar.ColumnarWriter`
+derived_columns = {settings.tsi_str: [('timestamp', 'datetime64[s]')]}
+
+
+def schema(data_type=None):
+    """Get the names and types of the columns of the output data
+
+    Args:
+        data_type (str): type of data, settings.data_type by default
+
+    Returns:
+        list: (name, NumPy type) of every column
+    """
+    return schemas[data_type or settings.data_type]
 
 
 def headers(writer):
@@ -7,69 +81,96 @@ def headers(writer):
     Args:
         writer: csv writing object
     """
-    if settings.data_type == settings.tsi_str:
-        writer.writerow(['filename',
-                         'altitude',
-                         'azimuth',
-                         'thin_sky_cover',
-                         'opaque_sky_cover',
-                         'cloud_cover_fixed',
-                         'cloud_cover_hybrid',
-                         'thin_cloud_cover_TSI',
-                         'opaque_cloud_cover_TSI',
-                         'cloud_cover_TSI',
-                         'energy',
-                         'entropy',
-                         'contrast',
-                         'homogeneity',
-                         'outside_c',
-                         'outside_s',
-                         'horizon_c',
-                         'horizon_s',
-                         'inner_c',
-                         'inner_s',
-                         'sun_c',
-                         'sun_s',
-                         ])
-
-    elif settings.data_type == settings.cat_str:
-        writer.writerow(['filename',
-                         'mean_r',
-                         'mean_g',
-                         'mean_b',
-                         'st_dev',
-                         'skewness',
-                         'diff_rg',
-                         'diff_rb',
-                         'diff_gb',
-                         'enegry',
-                         'entropy',
-                         'contrast',
-                         'homogeneity',
-                         'cloud_cover_fixed',
-                         'cloud_cover_hybrid',
-                         'cloud_type'
-                         ])
-
-    elif settings.data_type == settings.seg_str:
-        writer.writerow(['filename',
-                         'cloud_cover_GT',
-                         'cloud_cover_fixed',
-                         'cloud_cover_hybrid',
-                         ])
-
-    elif settings.data_type == settings.mob_str:
-        writer.writerow(['filename',
-                         'azimuth',
-                         'altitude',
-                         'energy',
-                         'entropy',
-                         'contrast',
-                         'homogeneity',
-                         'cloud_cover'
-                         ])
+    writer.writerow([name for name, dtype in schema()])
 
 
 def output_data(writer, data_row):
     # if settings.data_type == 'TSI':
     writer.writerow(data_row)
+
+
+class AsyncWriter:
+    """Writer which writes the rows on a background thread, so the processing loop does not wait for the (network)
+    file system
+
+    The rows are collected and written in batches of settings.write_batch_size rows, in the order in which they are
+    received. When used as a context manager, the remaining rows are written on exit, also after an exception.
+
+    Args:
+        writer: csv writing object or :class:`columnar.ColumnarWriter`
+        file: file of the writer, flushed after every batch
+        processed: manifest to which the filenames of the rows are added once they are written, see
+            :class:`manifest.Manifest`
+    """
+    def __init__(self, writer, file=None, processed=None):
+        self.writer = writer
+        self.file = file
+        self.processed = processed
+
+        # rows of the batch which is being collected
+        self.rows = []
+
+        # exception raised by the background thread
+        self.error = None
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def writerow(self, data_row):
+        """Add a row, the rows are written per settings.write_batch_size rows
+
+        Args:
+            data_row: row of the output data
+        """
+        if self.error is not None:
+            raise self.error
+
+        self.rows.append(data_row)
+
+        if len(self.rows) >= settings.write_batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send the collected rows to the background thread"""
+        if self.rows:
+            self.queue.put(self.rows)
+            self.rows = []
+
+    def run(self):
+        """Write the batches until the end of the queue (None) is reached"""
+        while True:
+            rows = self.queue.get()
+            if rows is None:
+                break
+
+            # after an error the remaining batches are not written
+            if self.error is not None:
+                continue
+
+            try:
+                for data_row in rows:
+                    self.writer.writerow(data_row)
+
+                if self.file is not None:
+                    self.file.flush()
+
+                if self.processed is not None:
+                    self.processed.update(data_row[0] for data_row in rows)
+            except Exception as error:
+                self.error = error
+
+    def close(self):
+        """Write the remaining rows and wait until all rows are written"""
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error